@@ -1,8 +1,37 @@
-from collections import defaultdict, deque
+import struct
+from collections import Counter, defaultdict, deque
 
 from utils import is_loc
 import locset as ls
 
+# Header of to_bytes(): version, whether there are bounds, minrow, mincol,
+# maxrow, maxcol, width, height, depth and number of colors
+_HEADER = struct.Struct('<BBiiiiHHBB')
+_VERSION = 1
+
+class MoveDiff:
+    '''
+    The changes made to a game state by one move.
+    '''
+    __slots__ = ('swapped', 'stripped', 'tops')
+
+    def __init__(self, swapped, stripped, tops):
+        '''
+        Fields:
+            swapped: the pair of locations swapped
+            stripped: a dict mapping each stripped location to the color
+            removed from it
+            tops: a dict mapping each location whose top color changed,
+            swapped or stripped, to its new top color, or None if it is now
+            empty
+        '''
+        self.swapped = swapped
+        self.stripped = stripped
+        self.tops = tops
+
+    def __repr__(self):
+        return f'MoveDiff({self.swapped!r}, {self.stripped!r}, {self.tops!r})'
+
 class GameState:
     '''
     An instance represents a state of a dissembler game, i.e. stores the
@@ -16,11 +45,37 @@ class GameState:
             color_to_loc: a dict mapping a color to a set of locations
             maxrow, maxcol: highest row and column indicies
             minrow, mincol: lowest row and column indicies
+            color_layers: a dict mapping a color to its number of layers
+            across all locations, at any depth
+            color_depths: a dict mapping a color to a Counter mapping n to
+            the number of locations holding exactly n layers of the color
         '''
         self.maxrow, self.maxcol = 0, 0
         self.minrow, self.mincol = 4e9, 4e9
         self.loc_to_color = defaultdict(deque)
         self.color_to_loc = defaultdict(set)
+        self.color_layers = defaultdict(int)
+        self.color_depths = defaultdict(Counter)
+
+    def _count_layer(self, color, copies, change):
+        '''
+        Arguments:
+            color: a color
+            copies: the number of layers of 'color' a location held
+            change: 1 if the location gained a layer of 'color', -1 if it
+            lost one
+
+        Updates color_layers and color_depths.
+        '''
+        depths = self.color_depths[color]
+        if copies:
+            depths[copies] -= 1
+            if not depths[copies]:
+                del depths[copies]
+        if copies + change:
+            depths[copies + change] += 1
+
+        self.color_layers[color] += change
 
     def add(self, loc, color):
         '''
@@ -40,9 +95,40 @@ class GameState:
         if not color_queue:
             self.color_to_loc[color].add(loc)
 
+        self._count_layer(color, color_queue.count(color), 1)
         color_queue.append(color)
 
 
+        if loc[0] > self.maxrow:
+            self.maxrow = loc[0]
+        if loc[1] > self.maxcol:
+            self.maxcol = loc[1]
+        if loc[0] < self.minrow:
+            self.minrow = loc[0]
+        if loc[1] < self.mincol:
+            self.mincol = loc[1]
+
+    def push(self, loc, color):
+        '''
+        Arguments:
+            loc: a (x, y) tuple describing a location
+            color: a string representing a valid tkinter color
+
+        Puts 'color' on top of the stack of colors associated with 'loc',
+        making it the current color. The reverse of strip().
+        '''
+        assert is_loc(loc)
+        assert type(color) is str
+
+        color_queue = self.loc_to_color[loc]
+
+        if color_queue:
+            self.color_to_loc[color_queue[0]].remove(loc)
+        self.color_to_loc[color].add(loc)
+
+        self._count_layer(color, color_queue.count(color), 1)
+        color_queue.appendleft(color)
+
         if loc[0] > self.maxrow:
             self.maxrow = loc[0]
         if loc[1] > self.maxcol:
@@ -66,6 +152,7 @@ class GameState:
 
         color = color_queue.popleft()
         self.color_to_loc[color].remove(loc)
+        self._count_layer(color, color_queue.count(color) + 1, -1)
 
         try:
             new_color = color_queue[0]
@@ -104,13 +191,30 @@ class GameState:
         Returns a bool representing if there are any connected color groups.
         '''
         for color, locset in self.color_to_loc.items():
-            smaller, larger = ls.filter_locset(locset)
-
-            if larger:
+            if ls.has_large_group(locset):
                 return True
 
         return False
 
+    def is_dead(self):
+        '''
+        Returns whether the board can provably never be cleared, judging by
+        the number of layers of each color alone.
+
+        Every removal strips one layer of a color from at least three
+        locations at once, and a location is always stripped at most once
+        per removal. So a location holding n layers of a color takes part
+        in n removals of it, each also stripping two other layers of the
+        color: the board is dead once some color has fewer than three
+        times as many layers in total as any location holds of it. This
+        covers colors left on only one or two locations.
+        Takes time proportional to the number of colors.
+        '''
+        for color, layers in self.color_layers.items():
+            if layers and 3 * max(self.color_depths[color]) > layers:
+                return True
+        return False
+
     def remove_connected_groups(self):
         '''
         Strips one color from all connected color groups covering at least 
@@ -120,12 +224,13 @@ class GameState:
         '''
         removed = set()
 
+        # Find every group before stripping, so that colors uncovered by
+        # the stripping are left for the next move
         for color, locset in self.color_to_loc.items():
-            smaller, larger = ls.filter_locset(locset)
+            removed |= ls.large_groups(locset)
 
-            for loc in larger:
-                self.strip(loc)
-                removed.add(loc)
+        for loc in removed:
+            self.strip(loc)
 
         return removed             
 
@@ -174,11 +279,233 @@ class GameState:
         assert is_loc(loc1)
         assert is_loc(loc2)
 
-        if not self.is_move_valid(loc1, loc2):
+        return set(self.apply_move(loc1, loc2).stripped)
+
+    def apply_move(self, loc1, loc2, exposed=None):
+        '''
+        Arguments:
+            loc1, loc2: two locations
+            exposed: the locations stripped by the previous move, if that
+            was made by apply_move() too, or None
+
+        Makes the move swapping loc1 and loc2, finding the connected color
+        groups only once. Returns a MoveDiff of the changes. Raises
+        ValueError, leaving the game state as it was, if the move is not
+        valid.
+
+        Every group after a swap holds a swapped location or one stripped
+        by the previous move, as any other group would have been removed
+        then. Given 'exposed', only groups holding those are looked for,
+        which is much faster on large boards.
+        '''
+        if not self.loc_to_color.get(loc1) or \
+        not self.loc_to_color.get(loc2) or not ls.is_adjacent(loc1, loc2):
             raise ValueError('Invalid move!')
 
         self.swap(loc1, loc2)
-        return self.remove_connected_groups()
+
+        if exposed is None:
+            removed = set()
+            for color, locset in self.color_to_loc.items():
+                removed |= ls.large_groups(locset)
+        else:
+            removed = self.groups_at(set(exposed) | {loc1, loc2})
+
+        if not removed:
+            self.swap(loc1, loc2)
+            raise ValueError('Invalid move!')
+
+        stripped = {}
+        tops = {loc1: self.loc_to_color[loc1][0],
+            loc2: self.loc_to_color[loc2][0]}
+        for loc in removed:
+            color_queue = self.loc_to_color[loc]
+            stripped[loc] = color_queue[0]
+            self.strip(loc)
+            tops[loc] = color_queue[0] if color_queue else None
+
+        return MoveDiff((loc1, loc2), stripped, tops)
+
+    def groups_at(self, locs):
+        '''
+        Arguments:
+            locs: an iterable of locations
+
+        Returns the set of locations in connected color groups covering at
+        least three squares that hold one of 'locs'.
+        '''
+        found = set()
+        for loc in locs:
+            color_queue = self.loc_to_color.get(loc)
+            if color_queue and loc not in found:
+                group = ls._flood_fill(loc, self.color_to_loc[color_queue[0]])
+                if len(group) >= 3:
+                    found |= group
+        return found
+
+    def revert(self, diff):
+        '''
+        Arguments:
+            diff: the MoveDiff of the last move made
+
+        Undoes the move, restoring the game state to before it.
+        '''
+        for loc, color in diff.stripped.items():
+            self.push(loc, color)
+        self.swap(*diff.swapped)
+
+    def legal_moves(self):
+        '''
+        Yields every valid move as a pair of locations, each pair once.
+        '''
+        for loc, color_queue in list(self.loc_to_color.items()):
+            if not color_queue:
+                continue
+            for other in ((loc[0] + 1, loc[1]), (loc[0], loc[1] + 1)):
+                if self.loc_to_color.get(other) and \
+                self._removes_any(loc, other):
+                    yield loc, other
+
+    def copy(self):
+        '''
+        Returns an independent copy of the game state. Much faster than
+        deepcopy().
+        '''
+        new = GameState.__new__(GameState)
+        new.__dict__.update(self.__dict__)
+        new.loc_to_color = defaultdict(deque, {loc: deque(color_queue)
+            for loc, color_queue in self.loc_to_color.items() if color_queue})
+        new.color_to_loc = defaultdict(set, {color: set(locset)
+            for color, locset in self.color_to_loc.items() if locset})
+        new.color_layers = defaultdict(int, {color: layers
+            for color, layers in self.color_layers.items() if layers})
+        new.color_depths = defaultdict(Counter, {color: Counter(depths)
+            for color, depths in self.color_depths.items() if depths})
+        return new
+
+    def successor(self, move):
+        '''
+        Arguments:
+            move: a valid move, as a pair of locations
+
+        Returns a copy of the game state after making 'move'. Unlike
+        make_move(), does not check that the move is valid.
+        '''
+        new = self.copy()
+        new.swap(*move)
+        new.remove_connected_groups()
+        return new
+
+    def key(self):
+        '''
+        Returns a hashable value that is equal for two game states exactly
+        when they have the same colors at the same locations.
+        '''
+        return tuple(sorted((loc, tuple(color_queue))
+            for loc, color_queue in self.loc_to_color.items() if color_queue))
+
+    def to_bytes(self):
+        '''
+        Returns a compact encoding of the game state, read by from_bytes().
+
+        After a header, holds the colors as length-prefixed UTF-8 strings,
+        then for each location of the bounding box, row by row, its stack
+        of colors from the top as indices into the colors starting at 1,
+        padded with zeros to the height of the highest stack.
+        '''
+        squares = [(loc, color_queue) for loc, color_queue
+            in self.loc_to_color.items() if color_queue]
+        palette = [color for color, layers in self.color_layers.items()
+            if layers]
+        if len(palette) > 255:
+            raise ValueError('Too many colors!')
+        ids = {color: i + 1 for i, color in enumerate(palette)}.__getitem__
+
+        # Bounds are kept as they are, so a decoded state is drawn the same
+        bounded = self.minrow <= self.maxrow
+        if bounded:
+            minrow, mincol = self.minrow, self.mincol
+            width = self.maxrow - minrow + 1
+            height = self.maxcol - mincol + 1
+        else:
+            minrow = mincol = width = height = 0
+        depth = max((len(color_queue) for loc, color_queue in squares),
+            default=0)
+
+        parts = [_HEADER.pack(_VERSION, bounded, minrow, mincol, self.maxrow,
+            self.maxcol, width, height, depth, len(palette))]
+        for color in palette:
+            name = color.encode()
+            parts.append(bytes([len(name)]) + name)
+
+        cells = bytearray(width * height * depth)
+        for loc, color_queue in squares:
+            start = ((loc[1] - mincol) * width + loc[0] - minrow) * depth
+            cells[start:start + len(color_queue)] = bytes(map(ids,
+                color_queue))
+        parts.append(cells)
+
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        Returns a new game state from the encoding 'data' of to_bytes().
+        Raises ValueError if 'data' is not such an encoding.
+        '''
+        try:
+            version, bounded, minrow, mincol, maxrow, maxcol, width, height, \
+                depth, ncolors = _HEADER.unpack_from(data)
+        except struct.error as e:
+            raise ValueError('Not an encoded game state') from e
+        if version != _VERSION:
+            raise ValueError(f'Unknown encoding version {version}')
+
+        offset = _HEADER.size
+        palette = [None]
+        for i in range(ncolors):
+            length = data[offset]
+            palette.append(data[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+
+        if len(data) - offset != width * height * depth:
+            raise ValueError('Not an encoded game state')
+
+        game_state = cls.__new__(cls)
+        game_state.__init__()
+        loc_to_color = game_state.loc_to_color
+        color_to_loc = game_state.color_to_loc
+        color_depths = game_state.color_depths
+        name = palette.__getitem__
+
+        cells = data[offset:]
+        for color in range(1, ncolors + 1):
+            game_state.color_layers[palette[color]] = cells.count(color)
+
+        for i in range(width * height):
+            stack = cells[i * depth:(i + 1) * depth].rstrip(b'\0')
+            if not stack:
+                continue
+
+            loc = (minrow + i % width, mincol + i // width)
+            color_queue = deque(map(name, stack))
+            loc_to_color[loc] = color_queue
+            color_to_loc[color_queue[0]].add(loc)
+
+            if len(stack) == 1:
+                color_depths[color_queue[0]][1] += 1
+            else:
+                for color in set(stack):
+                    color_depths[palette[color]][stack.count(color)] += 1
+
+        if bounded:
+            game_state.minrow, game_state.mincol = minrow, mincol
+            game_state.maxrow, game_state.maxcol = maxrow, maxcol
+        return game_state
+
+    def __reduce__(self):
+        # Pickling and copy.deepcopy() go through the compact encoding
+        return self.__class__.from_bytes, (self.to_bytes(),)
 
     def nrows(self):
         '''
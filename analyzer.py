@@ -0,0 +1,238 @@
+'''
+Difficulty analysis of dissembler puzzles.
+
+Explores every state reachable from a puzzle, visiting each distinct state
+once, and computes:
+    states, edges: size of the state graph
+    dead_ends: states that are not won but have no valid moves, or that
+    GameState.is_dead() proves lost; the latter are not explored further
+    dead_end_fraction: dead_ends / states
+    branching: average number of valid moves of the explored states at each
+    depth, where the depth of a state is its fewest moves from the puzzle
+    min_solution_length: fewest moves that clear the board, None if the
+    puzzle cannot be solved
+    solution: one such shortest list of moves
+    solutions: number of distinct move sequences that clear the board
+    random_win_chance: chance that playing uniformly random valid moves
+    clears the board
+    difficulty: log10(1 / random_win_chance), infinite if unsolvable
+
+    python analyzer.py                      analyze the bundled puzzles
+    python analyzer.py corpus.txt --rank    rank a corpus, one puzzle a line
+'''
+
+import argparse, json, math, multiprocessing, sys
+
+import GameState as gs
+import locset as ls
+import puzzle_io
+import solver
+from puzzle_io import bundled_puzzles, read_corpus
+from solution_cache import SolutionCache
+
+def _layers(key):
+    return sum(len(color_queue) for loc, color_queue in key)
+
+def analyze(game_state):
+    '''
+    Arguments:
+        game_state: a GameState, not altered
+
+    Returns a dict of the difficulty metrics of 'game_state', see the module
+    docstring.
+    '''
+    # The groups remembered for other puzzles are of no use for this one
+    ls.clear_group_cache()
+
+    root = game_state.copy()
+    root_key = root.key()
+
+    # Maps state keys to their depth and list of (move, successor key)
+    depths = {root_key: 0}
+    successors = {}
+    frontier = [(root, root_key)]
+    depth = 0
+    branching = []
+
+    while frontier:
+        next_frontier = []
+        moves_at_depth = 0
+        expanded = 0
+
+        for state, key in frontier:
+            edges = []
+            successors[key] = edges
+            if state.is_dead():
+                continue
+
+            expanded += 1
+            for move in state.legal_moves():
+                child = state.successor(move)
+                child_key = child.key()
+                edges.append((move, child_key))
+
+                if child_key not in depths:
+                    depths[child_key] = depth + 1
+                    next_frontier.append((child, child_key))
+
+            moves_at_depth += len(edges)
+
+        branching.append(moves_at_depth / expanded if expanded else 0.0)
+        frontier = next_frontier
+        depth += 1
+
+    # Each move strips at least three colors, so going through the states
+    # by increasing number of colors visits successors first
+    solutions = {}
+    shortest = {}
+    win_chance = {}
+    dead_ends = 0
+    edge_count = 0
+
+    for key in sorted(successors, key=_layers):
+        edges = successors[key]
+        edge_count += len(edges)
+
+        if not key:
+            solutions[key] = 1
+            shortest[key] = []
+            win_chance[key] = 1.0
+            continue
+
+        if not edges:
+            dead_ends += 1
+
+        solutions[key] = sum(solutions[child] for move, child in edges)
+        win_chance[key] = sum(win_chance[child] for move, child in edges) / \
+            len(edges) if edges else 0.0
+
+        best = None
+        for move, child in edges:
+            if shortest[child] is not None and \
+            (best is None or len(shortest[child]) + 1 < len(best)):
+                best = [move] + shortest[child]
+        shortest[key] = best
+
+    solution = shortest[root_key]
+    chance = win_chance[root_key]
+
+    return {
+        'states': len(successors),
+        'edges': edge_count,
+        'dead_ends': dead_ends,
+        'dead_end_fraction': dead_ends / len(successors),
+        'branching': branching,
+        'min_solution_length': None if solution is None else len(solution),
+        'solution': solution,
+        'solutions': solutions[root_key],
+        'random_win_chance': chance,
+        'difficulty': math.log10(1 / chance) if chance else math.inf,
+    }
+
+def analyze_text(text):
+    '''
+    Returns analyze() of the puzzle 'text' in the text format.
+    '''
+    return analyze(puzzle_io.parse(text, gs.GameState()))
+
+def analyze_corpus(texts, jobs=1):
+    '''
+    Arguments:
+        texts: an iterable of puzzles in the text format
+        jobs: number of worker processes
+
+    Returns a list of the analyze() results in the order of 'texts'.
+    '''
+    if jobs == 1:
+        return [analyze_text(text) for text in texts]
+
+    with multiprocessing.Pool(jobs) as pool:
+        return pool.map(analyze_text, texts, chunksize=4)
+
+def cached_result(solution):
+    '''
+    Returns the analyze() result of a puzzle whose shortest solution,
+    'solution', was found in a SolutionCache. The metrics only an analysis
+    computes are None, and 'cached' is True.
+    '''
+    return {
+        'states': None,
+        'edges': None,
+        'dead_ends': None,
+        'dead_end_fraction': None,
+        'branching': None,
+        'min_solution_length': None if solution is None else len(solution),
+        'solution': solution,
+        'solutions': None,
+        'random_win_chance': None,
+        'difficulty': None,
+        'cached': True,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='*',
+        help='puzzle files, one puzzle per line (default: bundled puzzles)')
+    parser.add_argument('--rank', action='store_true',
+        help='list the puzzles from easiest to hardest')
+    parser.add_argument('--jobs', type=int, default=1,
+        help='number of worker processes (default: 1)')
+    parser.add_argument('--json', metavar='PATH',
+        help='save all metrics as JSON')
+    parser.add_argument('--cache', metavar='PATH',
+        help='answer the puzzles found in this solution cache from it, '
+        'with their shortest solution only, and store the shortest '
+        'solutions of the others in it')
+    args = parser.parse_args(argv)
+
+    named = read_corpus(args.files) if args.files else bundled_puzzles()
+    results = [None] * len(named)
+
+    cache = SolutionCache(args.cache) if args.cache else None
+    if cache is not None:
+        for i, (name, text) in enumerate(named):
+            try:
+                results[i] = cached_result(
+                    cache.get(puzzle_io.parse(text, gs.GameState())))
+            except KeyError:
+                pass
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(missing, analyze_corpus([named[i][1]
+    for i in missing], args.jobs)):
+        results[i] = result
+    rows = list(zip(named, results))
+
+    if cache is not None:
+        for i in missing:
+            solver.store(cache, puzzle_io.parse(named[i][1], gs.GameState()),
+                results[i]['solution'])
+        cache.close()
+
+    if args.rank:
+        # Puzzles answered from the cache have no difficulty, and come last
+        rows.sort(key=lambda row: (row[1]['difficulty'] is None,
+            row[1]['difficulty'] or 0))
+
+    for (name, text), result in rows:
+        length = result['min_solution_length']
+        moves = f'  moves {"-" if length is None else length:>3}'
+        if result.get('cached'):
+            print(f'{name:<24} (cached)' + moves)
+            continue
+        print(f'{name:<24} difficulty {result["difficulty"]:7.2f}' + moves +
+            f'  solutions {result["solutions"]:>8}' +
+            f'  states {result["states"]:>7}' +
+            f'  dead ends {result["dead_end_fraction"]:6.1%}')
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump([dict(result, name=name, puzzle=text,
+                difficulty=None if result['difficulty'] is None or
+                math.isinf(result['difficulty']) else result['difficulty'])
+                for (name, text), result in rows], file, indent=2)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
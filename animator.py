@@ -42,9 +42,10 @@ class Animator:
             self.game_canvas.move(tag2, 0, SWAP_SPEED)
             self.game_canvas.move(tag1, 0, -SWAP_SPEED)
         
+        # Squares are placed by their center
         space_coord = self.main.loc_to_coord(loc2)
-        square_coord = (space_coord[0] + self.main.spacing, 
-            space_coord[1] + self.main.spacing)
+        square_coord = (space_coord[0] + self.main.space_size / 2, 
+            space_coord[1] + self.main.space_size / 2)
 
         item = self.game_canvas.find_withtag(tag1)
         if type(item) is tuple:
@@ -53,7 +54,9 @@ class Animator:
         distx, disty = self.distance(square_coord,
             self.game_canvas.coords(item)[:2])
 
-        if abs(distx) < SWAP_SPEED and abs(disty) < SWAP_SPEED:
+        # Input waiting for the animation fast-forwards it
+        if abs(distx) < SWAP_SPEED and abs(disty) < SWAP_SPEED or \
+        self.main.input_queue:
             self.animating = False
             self.game_canvas.move(tag1, distx, disty)
             self.game_canvas.move(tag2, -distx, -disty)
@@ -62,7 +65,7 @@ class Animator:
             
             return
 
-        self.game_task = self.game_canvas.after(15, lambda tag1=tag1, tag2=tag2, 
+        self.game_task = self.game_canvas.after(FRAME_DELAY, lambda tag1=tag1, tag2=tag2, 
             loc2=loc2, direction=direction, removed=removed: 
             self.animate_swap(tag1, tag2, loc2, direction, removed))
 
@@ -74,51 +77,66 @@ class Animator:
         '''
         self.animating = True
 
-        space_size, _x, _y = self.main.get_drawing_dimensions()
+        if not i:
+            self.detach_top_squares(removed)
 
-        for loc in removed:
-            xspace, yspace = self.main.loc_to_coord(loc)
-
-            items = self.game_canvas.find_overlapping(xspace, yspace, 
-                xspace + space_size, yspace + space_size)
-
-            for item in items:
-                # Don't animate inside color squares
-                if len(self.game_canvas.gettags(item)) == 1:
-                    continue
-
-                coords = self.game_canvas.coords(item)
-                new_coords = []
+        for item in self.game_canvas.find_withtag('stripped'):
+            coords = self.game_canvas.coords(item)
+            new_coords = []
 
-                # coordinate of center of rectangle
-                try:
-                    offset = ((coords[0] + coords[4]) / 2) + \
-                    ((coords[1] + coords[3]) / 2)*1j
-                except IndexError:
-                    offset = coords[0]+coords[1]*1j
+            # coordinate of center of rectangle
+            try:
+                offset = ((coords[0] + coords[4]) / 2) + \
+                ((coords[1] + coords[3]) / 2)*1j
+            except IndexError:
+                offset = coords[0]+coords[1]*1j
 
-                # Multiply coordinates by a complex number to rotate
-                it = iter(coords)
-                for coord in it:
-                    x, y = coord, next(it)
-                    complex_coord = x + y*1j
-                    transformed = (complex_coord - offset)*cmath.exp(
-                        1j*ROTATION_SPEED)*SHRINK_FACTOR + offset
+            # Multiply coordinates by a complex number to rotate
+            it = iter(coords)
+            for coord in it:
+                x, y = coord, next(it)
+                complex_coord = x + y*1j
+                transformed = (complex_coord - offset)*cmath.exp(
+                    1j*ROTATION_SPEED)*SHRINK_FACTOR + offset
 
-                    new_coords.append((transformed.real)) 
-                    new_coords.append((transformed.imag))
+                new_coords.append((transformed.real)) 
+                new_coords.append((transformed.imag))
 
-                self.game_canvas.coords(item, *new_coords)
+            self.game_canvas.coords(item, *new_coords)
 
-        if i > REMOVE_TIME:
+        if i > REMOVE_TIME or self.main.input_queue:
             self.animating = False
             self.main.draw_game_state()
             self.main.check_victory()
+            self.main.process_input()
             return
 
-        self.game_task = self.game_canvas.after(15, lambda i=i: 
+        self.game_task = self.game_canvas.after(FRAME_DELAY, lambda i=i: 
             self.animate_removal(removed, i + 1))
 
+    def detach_top_squares(self, removed):
+        '''
+        Arguments:
+            removed: a set of locations that had their colors stripped
+
+        Redraws the squares at 'removed' without their top color, which is
+        drawn again behind them as a polygon tagged 'stripped' that can be
+        rotated.
+        '''
+        space_size = self.main.space_size
+
+        for loc in removed:
+            item = self.main.square_at(loc)
+            if item is None:
+                continue
+            signature = self.main.squares[item][0]
+
+            self.main.draw_square_in_grid(self.game_canvas, space_size,
+                *self.main.loc_to_coord(loc), signature[0], 'stripped',
+                self.main.spacing)
+            self.game_canvas.tag_lower('stripped', item)
+            self.main.show_sprite(item, (None,) + signature[1:])
+
     def animate_victory(self, length, image):
         '''
         Arguments:
@@ -132,6 +150,7 @@ class Animator:
         if max(image.width(), image.height()) * IMAGE_GROWTH_FACTOR[0] / \
         IMAGE_GROWTH_FACTOR[1] > length:
             self.animating = False
+            self.main.process_input()
             return
 
         image = image.zoom(IMAGE_GROWTH_FACTOR[0])
@@ -140,7 +159,7 @@ class Animator:
         self.game_canvas.image = image
         self.game_canvas.itemconfig('photo', image=image)
         
-        self.game_canvas.after(15, 
+        self.game_canvas.after(FRAME_DELAY, 
             lambda: self.animate_victory(length, image))
 
     def animate_text(self, text, text_variable):
@@ -189,6 +208,7 @@ class Animator:
             self.game_canvas.after_cancel(self.game_task)
 
             self.main.square_clicked = None
+            self.main.input_queue.clear()
 
     def cancel_text_animation(self, text_variable):
         '''
@@ -0,0 +1,191 @@
+'''
+Batched evaluation of moves on many boards at once. Requires NumPy.
+
+Boards are stored as a uint8 array of shape (N, depth, height, width):
+boards[i, d, y, x] is the color id of layer d (0 being the top) of location
+(x, y) of board i, 0 meaning no color. The stack of every location is packed
+towards the top. encode() and decode() convert between GameStates and this
+layout; the color ids index into a palette of color strings.
+
+evaluate() checks and applies one swap per board in a single vectorized
+call, and expand() uses it to generate all successors of a whole search
+frontier at once.
+'''
+
+import numpy as np
+
+import GameState as gs
+
+def encode(game_states, palette=None, width=None, height=None, depth=None):
+    '''
+    Arguments:
+        game_states: a list of GameStates
+        palette: a list of colors to number from 1, extended with any other
+        colors found
+        width, height, depth: dimensions of the array, by default just
+        large enough for all of 'game_states'
+
+    Returns (boards, palette).
+    '''
+    palette = list(palette or [])
+    ids = {color: i + 1 for i, color in enumerate(palette)}
+    squares = [game_state.key() for game_state in game_states]
+
+    cells = [(loc, color_queue) for key in squares
+        for loc, color_queue in key]
+    if width is None:
+        width = max((loc[0] + 1 for loc, color_queue in cells), default=0)
+    if height is None:
+        height = max((loc[1] + 1 for loc, color_queue in cells), default=0)
+    if depth is None:
+        depth = max((len(color_queue) for loc, color_queue in cells),
+            default=0)
+
+    boards = np.zeros((len(game_states), depth, height, width), np.uint8)
+    for i, key in enumerate(squares):
+        for (x, y), color_queue in key:
+            for d, color in enumerate(color_queue):
+                if color not in ids:
+                    if len(palette) == 255:
+                        raise ValueError('Too many colors!')
+                    palette.append(color)
+                    ids[color] = len(palette)
+                boards[i, d, y, x] = ids[color]
+
+    return boards, palette
+
+def decode(boards, palette):
+    '''
+    Returns a list of GameStates holding the boards in the array 'boards',
+    whose color ids index into 'palette'.
+    '''
+    game_states = []
+    for board in boards:
+        game_state = gs.GameState()
+        for d, y, x in zip(*np.nonzero(board)):
+            # nonzero() lists layers in order, so stacks are built top down
+            game_state.add((int(x), int(y)), palette[board[d, y, x] - 1])
+        game_states.append(game_state)
+    return game_states
+
+def _label(top):
+    '''
+    Arguments:
+        top: an (N, height, width) array of top color ids
+
+    Returns an array of the same shape giving each location the flat index
+    of a location of its connected color group; empty locations get their
+    own index.
+    '''
+    labels = np.arange(top.size).reshape(top.shape)
+    filled = top != 0
+    same_x = filled[:, :, :-1] & (top[:, :, :-1] == top[:, :, 1:])
+    same_y = filled[:, :-1, :] & (top[:, :-1, :] == top[:, 1:, :])
+
+    while True:
+        new = labels.copy()
+        np.minimum(new[:, :, :-1], labels[:, :, 1:], out=new[:, :, :-1],
+            where=same_x)
+        np.minimum(new[:, :, 1:], labels[:, :, :-1], out=new[:, :, 1:],
+            where=same_x)
+        np.minimum(new[:, :-1, :], labels[:, 1:, :], out=new[:, :-1, :],
+            where=same_y)
+        np.minimum(new[:, 1:, :], labels[:, :-1, :], out=new[:, 1:, :],
+            where=same_y)
+
+        # Jump to the label of the label, which is in the same group
+        new = new.ravel()[new]
+
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+def groups(boards):
+    '''
+    Returns a bool array of shape (N, height, width) marking the locations
+    of every board in 'boards' that are in a connected color group of three
+    or more.
+    '''
+    top = boards[:, 0]
+    labels = _label(top)
+    sizes = np.bincount(labels.ravel(), minlength=labels.size)
+    return (top != 0) & (sizes[labels] >= 3)
+
+def strip(boards, mask):
+    '''
+    Returns a copy of 'boards' with the top color removed at every location
+    marked in the (N, height, width) bool array 'mask'.
+    '''
+    stripped = boards.copy()
+    stripped[:, :-1] = np.where(mask[:, None], boards[:, 1:], boards[:, :-1])
+    stripped[:, -1] = np.where(mask, 0, boards[:, -1])
+    return stripped
+
+def evaluate(boards, moves):
+    '''
+    Arguments:
+        boards: an (N, depth, height, width) array of boards
+        moves: an (N, 4) int array of moves (x1, y1, x2, y2), one per board
+
+    Returns (valid, removed, successors):
+        valid: an (N,) bool array, like GameState.is_move_valid()
+        removed: an (N, height, width) bool array of the locations stripped
+        by each valid move
+        successors: the boards after each valid move, like
+        GameState.make_move(); boards with an invalid move are unchanged
+    '''
+    n, depth, height, width = boards.shape
+    moves = np.asarray(moves)
+    x1, y1, x2, y2 = moves.T
+    rows = np.arange(n)
+
+    inside = (x1 >= 0) & (x1 < width) & (y1 >= 0) & (y1 < height) & \
+        (x2 >= 0) & (x2 < width) & (y2 >= 0) & (y2 < height)
+    adjacent = np.abs(x1 - x2) + np.abs(y1 - y2) == 1
+    x1, y1, x2, y2 = (np.where(inside, v, 0) for v in (x1, y1, x2, y2))
+
+    ok = inside & adjacent & (boards[rows, 0, y1, x1] != 0) & \
+        (boards[rows, 0, y2, x2] != 0)
+
+    swapped = boards.copy()
+    swapped[rows, :, y1, x1] = boards[rows, :, y2, x2]
+    swapped[rows, :, y2, x2] = boards[rows, :, y1, x1]
+
+    removed = groups(swapped) & ok[:, None, None]
+    valid = removed.any(axis=(1, 2))
+
+    successors = strip(swapped, removed)
+    successors[~valid] = boards[~valid]
+    return valid, removed, successors
+
+def candidate_moves(width, height):
+    '''
+    Returns an (M, 4) array of every swap of two adjacent locations in a
+    width x height box, each once.
+    '''
+    ys, xs = np.mgrid[0:height, 0:width]
+    xs, ys = xs.ravel(), ys.ravel()
+    right = xs < width - 1
+    down = ys < height - 1
+    return np.concatenate([
+        np.stack([xs[right], ys[right], xs[right] + 1, ys[right]], axis=1),
+        np.stack([xs[down], ys[down], xs[down], ys[down] + 1], axis=1),
+    ])
+
+def expand(boards):
+    '''
+    Arguments:
+        boards: an (N, depth, height, width) array, e.g. a search frontier
+
+    Returns (parents, moves, successors) for every valid move of every
+    board: the index of the board in 'boards', the (x1, y1, x2, y2) move,
+    and the board after it.
+    '''
+    n, depth, height, width = boards.shape
+    candidates = candidate_moves(width, height)
+
+    parents = np.repeat(np.arange(n), len(candidates))
+    moves = np.tile(candidates, (n, 1))
+
+    valid, removed, successors = evaluate(boards[parents], moves)
+    return parents[valid], moves[valid], successors[valid]
@@ -0,0 +1,336 @@
+'''
+Micro-benchmarks for the game kernels.
+
+Times the locset functions, the GameState move logic, the puzzle parser and
+the deepcopy used for undoing over every bundled puzzle (utils.puzzles and
+examples/) and a few synthetic boards. Results can be saved as a JSON
+baseline and later runs compared against it:
+
+    python benchmark.py --save bench_baseline.json
+    python benchmark.py --compare bench_baseline.json --threshold 0.25
+
+When comparing, the exit status is 1 if any kernel got slower than the
+baseline by more than the threshold.
+'''
+
+import argparse, glob, json, os, platform, random, sys, time
+from copy import deepcopy
+
+import GameState as gs
+import locset as ls
+import puzzle_io
+from utils import puzzles
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'examples')
+
+# (ncols, nrows, ncolors, depth) of the synthetic boards
+SYNTHETIC_BOARDS = [(8, 8, 3, 1), (12, 12, 4, 2), (20, 20, 5, 3)]
+
+DEFAULT_THRESHOLD = 0.25
+
+# Largest number of moves timed per board by the move kernels
+MAX_MOVES = 16
+
+def neighbors(loc):
+    '''
+    Arguments:
+        loc: a (x, y) location
+
+    Returns the four locations orthogonally adjacent to 'loc'.
+    '''
+    x, y = loc
+    return (x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)
+
+def _group_size(top, loc, color, limit):
+    '''
+    Returns the size of the group of 'color' around 'loc' in the dict 'top'
+    mapping locations to top colors, counting no further than 'limit'.
+    '''
+    seen = {loc}
+    stack = [loc]
+    while stack and len(seen) < limit:
+        for n in neighbors(stack.pop()):
+            if n not in seen and top.get(n) == color:
+                seen.add(n)
+                stack.append(n)
+    return len(seen)
+
+def synthetic_board(ncols, nrows, ncolors, depth, rng):
+    '''
+    Arguments:
+        ncols, nrows: dimensions of the board
+        ncolors: number of distinct colors
+        depth: maximum number of colors stacked in one square
+        rng: a random.Random instance
+
+    Returns a full GameState of random colors. As long as 'ncolors' is at
+    least 3, the top colors never form a group of three or more, like the
+    boards met during play.
+    '''
+    colors = [chr(ord('a') + i) for i in range(ncolors)]
+    game_state = gs.GameState()
+    top = {}
+
+    for r in range(nrows):
+        for c in range(ncols):
+            loc = (c, r)
+            candidates = colors[:]
+            rng.shuffle(candidates)
+            for color in candidates:
+                top[loc] = color
+                if _group_size(top, loc, color, 3) < 3:
+                    break
+
+            game_state.add(loc, top[loc])
+            for i in range(rng.randint(1, depth) - 1):
+                game_state.add(loc, rng.choice(colors))
+
+    return game_state
+
+def adjacent_pairs(game_state):
+    '''
+    Returns a list of all pairs of adjacent non-empty locations in
+    'game_state', each pair listed once.
+    '''
+    pairs = []
+    for loc in list(game_state):
+        if not game_state.loc_to_color.get(loc):
+            continue
+        x, y = loc
+        for other in ((x + 1, y), (x, y + 1)):
+            if game_state.loc_to_color.get(other):
+                pairs.append((loc, other))
+    return pairs
+
+def load_corpus():
+    '''
+    Returns a list of (name, text, game_state) tuples for every bundled
+    puzzle and synthetic board.
+    '''
+    corpus = []
+
+    for i, text in enumerate(puzzles):
+        corpus.append((f'utils.puzzles[{i}]', text,
+            puzzle_io.parse(text, gs.GameState())))
+
+    for filename in sorted(glob.glob(os.path.join(EXAMPLES_DIR, '*.txt'))):
+        game_state = puzzle_io.load(filename, gs.GameState())
+        corpus.append((f'examples/{os.path.basename(filename)}',
+            puzzle_io.to_text(game_state), game_state))
+
+    rng = random.Random(0)
+    for ncols, nrows, ncolors, depth in SYNTHETIC_BOARDS:
+        game_state = synthetic_board(ncols, nrows, ncolors, depth, rng)
+        corpus.append((f'synthetic-{ncols}x{nrows}-c{ncolors}-d{depth}',
+            puzzle_io.to_text(game_state), game_state))
+
+    return corpus
+
+def best_time(func, setup, repeat):
+    '''
+    Arguments:
+        func: a function of one argument to time
+        setup: a function returning the argument for 'func', called
+        untimed before each run
+        repeat: number of runs
+
+    Returns the fastest of 'repeat' runs in seconds.
+    '''
+    best = float('inf')
+    for i in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _sample_pairs(game_state):
+    '''
+    Returns the adjacent pairs of 'game_state' in a fixed random order.
+    '''
+    pairs = adjacent_pairs(game_state)
+    random.Random(0).shuffle(pairs)
+    return pairs
+
+def _valid_moves(game_state):
+    moves = []
+    for pair in _sample_pairs(game_state):
+        if len(moves) == MAX_MOVES:
+            break
+        if game_state.is_move_valid(*pair):
+            moves.append(pair)
+    return moves
+
+def _swapped_copies(game_state, moves):
+    copies = []
+    for loc1, loc2 in moves:
+        copy = deepcopy(game_state)
+        copy.swap(loc1, loc2)
+        copies.append(copy)
+    return copies
+
+def _bench_filter_locset(text, game_state):
+    locsets = [set(locset) for locset in game_state.color_to_loc.values()]
+    def run(arg):
+        for locset in locsets:
+            ls.filter_locset(locset)
+    return run, lambda: None
+
+def _bench_partition_connected(text, game_state):
+    locsets = [set(locset) for locset in game_state.color_to_loc.values()]
+    def run(arg):
+        for locset in locsets:
+            ls.partition_connected(locset)
+    return run, lambda: None
+
+def _bench_is_move_valid(text, game_state):
+    pairs = _sample_pairs(game_state)[:MAX_MOVES]
+    def run(arg):
+        for loc1, loc2 in pairs:
+            game_state.is_move_valid(loc1, loc2)
+    return run, lambda: None
+
+def _bench_make_move(text, game_state):
+    moves = _valid_moves(game_state)
+    def run(copies):
+        for copy, (loc1, loc2) in zip(copies, moves):
+            copy.make_move(loc1, loc2)
+    return run, lambda: [deepcopy(game_state) for move in moves]
+
+def _bench_remove_connected_groups(text, game_state):
+    moves = _valid_moves(game_state)
+    def run(copies):
+        for copy in copies:
+            copy.remove_connected_groups()
+    return run, lambda: _swapped_copies(game_state, moves)
+
+def _bench_parse(text, game_state):
+    def run(arg):
+        puzzle_io.parse(text, gs.GameState())
+    return run, lambda: None
+
+def _bench_deepcopy(text, game_state):
+    def run(arg):
+        deepcopy(game_state)
+    return run, lambda: None
+
+# Maps kernel names to functions (text, game_state) -> (run, setup)
+KERNELS = {
+    'filter_locset': _bench_filter_locset,
+    'partition_connected': _bench_partition_connected,
+    'is_move_valid': _bench_is_move_valid,
+    'make_move': _bench_make_move,
+    'remove_connected_groups': _bench_remove_connected_groups,
+    'parse': _bench_parse,
+    'deepcopy': _bench_deepcopy,
+}
+
+def run_benchmarks(kernels=None, repeat=5, corpus=None):
+    '''
+    Arguments:
+        kernels: names of the kernels to time, defaults to all of KERNELS
+        repeat: number of runs per kernel and board, the fastest is kept
+        corpus: as returned by load_corpus(), loaded if not given
+
+    Returns a JSON-serializable dict of results. For every kernel, 'boards'
+    maps board names to seconds and 'total' is their sum.
+    '''
+    if corpus is None:
+        corpus = load_corpus()
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'kernels': {},
+    }
+
+    for kernel in kernels or KERNELS:
+        boards = {}
+        for name, text, game_state in corpus:
+            run, setup = KERNELS[kernel](text, game_state)
+            boards[name] = best_time(run, setup, repeat)
+        results['kernels'][kernel] = {
+            'total': sum(boards.values()),
+            'boards': boards,
+        }
+
+    return results
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    '''
+    Arguments:
+        results, baseline: dicts as returned by run_benchmarks()
+        threshold: allowed relative slowdown, e.g. 0.25 for 25%
+
+    Returns a list of (kernel, baseline total, new total) for every kernel
+    that got slower than 'baseline' by more than 'threshold'.
+    '''
+    regressions = []
+
+    for kernel, result in results['kernels'].items():
+        try:
+            old = baseline['kernels'][kernel]['total']
+        except KeyError:
+            continue
+        if result['total'] > old * (1 + threshold):
+            regressions.append((kernel, old, result['total']))
+
+    return regressions
+
+def report(results, baseline=None):
+    '''
+    Prints the total time of every kernel, with the change relative to
+    'baseline' if given.
+    '''
+    for kernel, result in results['kernels'].items():
+        line = f'{kernel:<26}{result["total"] * 1000:>12.3f} ms'
+        if baseline and kernel in baseline['kernels']:
+            old = baseline['kernels'][kernel]['total']
+            line += f'{(result["total"] / old - 1) * 100:>+10.1f}%'
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--kernels', nargs='+', choices=list(KERNELS),
+        help='kernels to time (default: all)')
+    parser.add_argument('--repeat', type=int, default=5,
+        help='runs per kernel and board (default: 5)')
+    parser.add_argument('--save', metavar='PATH',
+        help='save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH',
+        help='compare against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='relative slowdown that counts as a regression ' +
+        f'(default: {DEFAULT_THRESHOLD})')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.kernels, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for kernel, old, new in regressions:
+            print(f'REGRESSION: {kernel} took {new * 1000:.3f} ms, ' +
+                f'baseline {old * 1000:.3f} ms')
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
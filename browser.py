@@ -0,0 +1,361 @@
+'''
+An in-app browser of puzzle directories and corpora.
+
+A Catalog lists the puzzles of a directory, one per file, or of a corpus,
+one per line, without reading or parsing them. A puzzle is parsed and its
+preview rendered only when first needed, and kept in a bounded cache, from
+which it is loaded when picked. The puzzles of the page below the visible
+rows are prepared ahead in a background thread.
+
+The PuzzleBrowser window only creates canvas items for the rows in view, so
+that a corpus of thousands of puzzles scrolls as fast as a short one.
+'''
+
+import collections, concurrent.futures, os, threading
+import tkinter as tk
+
+import GameState as gs
+import puzzle_io
+import thumbnails
+from constants import *
+
+class Entry:
+    '''
+    A parsed puzzle of a Catalog.
+    '''
+    __slots__ = ('name', 'text', 'game_state', 'preview', 'error')
+
+    def __init__(self, name, text, game_state=None, preview=None, error=None):
+        self.name = name
+        self.text = text
+        # The parsed puzzle, not to be altered, and its image as PPM bytes,
+        # or None if it is not a valid puzzle
+        self.game_state = game_state
+        self.preview = preview
+        self.error = error
+
+class Catalog:
+    '''
+    A list of named puzzles, parsed on demand.
+    '''
+    def __init__(self, names, texts=None, paths=None):
+        '''
+        Arguments:
+            names: a list of the names of the puzzles
+            texts: a list of the puzzles in the text format, or None if they
+            are read from 'paths'
+            paths: a list of the files holding the puzzles
+
+        Use open() or bundled() instead.
+        '''
+        self.names = names
+        self.texts = texts
+        self.paths = paths
+
+        # Maps indices to Entries, least recently used first
+        self.entries = collections.OrderedDict()
+        # Guards 'entries', 'pending' and the loading of entries, as the
+        # rendering caches of thumbnails are not thread-safe
+        self.lock = threading.Lock()
+        # Prepares entries ahead of use, see prefetch()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Indices of the entries submitted to 'executor' and not yet loaded
+        self.pending = set()
+
+    @classmethod
+    def open(cls, path):
+        '''
+        Returns the Catalog of the directory 'path', holding a puzzle in
+        each of its .txt files, or of the corpus file 'path', holding a
+        puzzle on each non-blank line. Raises OSError if it cannot be read.
+        '''
+        if os.path.isdir(path):
+            filenames = sorted(name for name in os.listdir(path)
+                if name.endswith('.txt'))
+            return cls(filenames,
+                paths=[os.path.join(path, name) for name in filenames])
+
+        names, texts = [], []
+        with open(path) as file:
+            for i, line in enumerate(file):
+                line = line.rstrip('\n')
+                if line.strip():
+                    names.append(f'{os.path.basename(path)}:{i + 1}')
+                    texts.append(line)
+        return cls(names, texts)
+
+    @classmethod
+    def bundled(cls):
+        '''
+        Returns the Catalog of the bundled puzzles.
+        '''
+        named = puzzle_io.bundled_puzzles()
+        return cls([name for name, text in named],
+            [text for name, text in named])
+
+    def __len__(self):
+        return len(self.names)
+
+    def get(self, i):
+        '''
+        Returns the Entry of puzzle 'i', parsing it if needed.
+        '''
+        with self.lock:
+            entry = self.entries.get(i)
+            if entry is not None:
+                self.entries.move_to_end(i)
+                return entry
+
+            entry = self._load(i)
+            self.entries[i] = entry
+            while len(self.entries) > BROWSER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+            return entry
+
+    def cached(self, i):
+        '''
+        Returns the Entry of puzzle 'i' if it was already parsed, else None.
+        '''
+        with self.lock:
+            return self.entries.get(i)
+
+    def is_pending(self, i):
+        '''
+        Returns whether the entry of puzzle 'i' is being prepared in the
+        background.
+        '''
+        with self.lock:
+            return i in self.pending
+
+    def _load(self, i):
+        '''
+        Returns the Entry of puzzle 'i', read and parsed. Called with 'lock'
+        held.
+        '''
+        name = self.names[i]
+        try:
+            if self.texts is not None:
+                text = self.texts[i]
+            else:
+                with open(self.paths[i]) as file:
+                    text = file.readline().rstrip('\n')
+
+            colors = []
+            def color_for(char):
+                # The colors of the preview, so that the game looks the same
+                colors.append(thumbnails.palette_color(len(colors)))
+                return colors[-1]
+            game_state = puzzle_io.parse(text, gs.GameState(), color_for)
+        except (OSError, StopIteration, ValueError) as e:
+            return Entry(name, None, error=str(e) or 'Malformed puzzle')
+
+        size = max(game_state.nrows(), game_state.ncols()) if game_state \
+            else 1
+        cell_size = max(2, (BROWSER_ROW_HEIGHT - 8) // size)
+        return Entry(name, text, game_state,
+            thumbnails.render(game_state, cell_size, 'ppm'))
+
+    def prefetch(self, indices):
+        '''
+        Prepares the entries of 'indices' in the background.
+        '''
+        for i in indices:
+            with self.lock:
+                if not 0 <= i < len(self) or i in self.pending or \
+                i in self.entries:
+                    continue
+                self.pending.add(i)
+            self.executor.submit(self._prefetch, i)
+
+    def _prefetch(self, i):
+        try:
+            self.get(i)
+        finally:
+            with self.lock:
+                self.pending.discard(i)
+
+    def close(self):
+        '''
+        Stops preparing entries.
+        '''
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class PuzzleBrowser:
+    '''
+    A window listing the puzzles of a Catalog with their previews. Picking
+    one starts playing it in the application.
+    '''
+    def __init__(self, main, catalog):
+        '''
+        Arguments:
+            main: the Application to play the picked puzzles in
+            catalog: the Catalog to list
+        '''
+        self.main = main
+        self.catalog = catalog
+
+        self.window = tk.Toplevel(main.master)
+        self.window.title('Puzzles')
+        self.window.geometry(f'{BROWSER_WIDTH}x{BROWSER_HEIGHT}')
+        self.window.protocol('WM_DELETE_WINDOW', self.close)
+
+        buttons = tk.Frame(self.window)
+        tk.Button(buttons, text='Open folder',
+            command=self.prompt_folder).pack(side='left')
+        tk.Button(buttons, text='Open corpus',
+            command=self.prompt_corpus).pack(side='left')
+        tk.Button(buttons, text='Bundled',
+            command=lambda: self.show(Catalog.bundled())).pack(side='left')
+        buttons.pack(fill='x')
+
+        self.scrollbar = tk.Scrollbar(self.window, orient='vertical',
+            command=self.on_scroll)
+        self.canvas = tk.Canvas(self.window, yscrollcommand=self.scrollbar.set,
+            background='white')
+        self.scrollbar.pack(side='right', fill='y')
+        self.canvas.pack(side='left', expand='yes', fill='both')
+
+        self.canvas.bind('<Configure>', lambda event: self.refresh())
+        self.canvas.bind('<MouseWheel>', lambda event:
+            self.on_scroll('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda event:
+            self.on_scroll('scroll', -1, 'units'))
+        self.canvas.bind('<Button-5>', lambda event:
+            self.on_scroll('scroll', 1, 'units'))
+
+        # Maps the indices of the rows in view to (canvas items, preview
+        # PhotoImage)
+        self.rows = {}
+        # The pending after() call showing the previews prepared in the
+        # background
+        self.poll_task = None
+
+        self.show(catalog)
+
+    def show(self, catalog):
+        '''
+        Lists 'catalog' instead of the current one.
+        '''
+        if catalog is not self.catalog:
+            self.catalog.close()
+            self.catalog = catalog
+
+        self.canvas.delete('all')
+        self.rows = {}
+        self.canvas.configure(yscrollincrement=BROWSER_ROW_HEIGHT,
+            scrollregion=(0, 0, 0, len(catalog) * BROWSER_ROW_HEIGHT))
+        self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def prompt_folder(self):
+        from tkinter.filedialog import askdirectory
+        self.open(askdirectory(parent=self.window))
+
+    def prompt_corpus(self):
+        from tkinter.filedialog import askopenfilename
+        self.open(askopenfilename(parent=self.window))
+
+    def open(self, path):
+        if not path:
+            return
+        try:
+            catalog = Catalog.open(path)
+        except OSError as e:
+            self.main.send_message(f'Could not open {path}: {e}', 'red')
+            return
+        self.show(catalog)
+
+    def on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.refresh()
+
+    def visible(self):
+        '''
+        Returns the range of the indices of the rows in view.
+        '''
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        first = max(0, int(top // BROWSER_ROW_HEIGHT))
+        last = min(len(self.catalog),
+            int((top + height) // BROWSER_ROW_HEIGHT) + 1)
+        return range(first, last)
+
+    def refresh(self):
+        '''
+        Draws the rows in view, drops the others, and prefetches the next
+        page.
+        '''
+        visible = self.visible()
+
+        for i in [i for i in self.rows if i not in visible]:
+            for item in self.rows.pop(i)[0]:
+                self.canvas.delete(item)
+
+        waiting = False
+        for i in visible:
+            if i in self.rows:
+                continue
+            # Rows in view are parsed right away unless already on their
+            # way from the background
+            entry = self.catalog.cached(i)
+            if entry is None and self.catalog.is_pending(i):
+                waiting = True
+                continue
+            self.draw_row(i, entry or self.catalog.get(i))
+
+        self.catalog.prefetch(range(visible.stop,
+            visible.stop + len(visible) * BROWSER_PREFETCH_PAGES))
+
+        if waiting and self.poll_task is None:
+            self.poll_task = self.window.after(BROWSER_POLL, self.poll)
+
+    def poll(self):
+        self.poll_task = None
+        self.refresh()
+
+    def draw_row(self, i, entry):
+        '''
+        Draws row 'i', showing 'entry'.
+        '''
+        y = i * BROWSER_ROW_HEIGHT
+        tag = f'row{i}'
+        items = [self.canvas.create_rectangle(0, y, BROWSER_WIDTH,
+            y + BROWSER_ROW_HEIGHT, fill='white', outline='#dddddd', tags=tag)]
+
+        preview = None
+        if entry.preview is not None:
+            preview = tk.PhotoImage(master=self.canvas, data=entry.preview)
+            items.append(self.canvas.create_image(4 + BROWSER_ROW_HEIGHT / 2,
+                y + BROWSER_ROW_HEIGHT / 2, image=preview, tags=tag))
+
+        label = entry.name if entry.error is None else \
+            f'{entry.name} - {entry.error}'
+        items.append(self.canvas.create_text(BROWSER_ROW_HEIGHT + 16,
+            y + BROWSER_ROW_HEIGHT / 2, text=label, anchor='w', font=FONT,
+            tags=tag))
+
+        self.canvas.tag_bind(tag, '<Button-1>',
+            lambda event, i=i: self.pick(i))
+        self.rows[i] = items, preview
+
+    def pick(self, i):
+        '''
+        Starts playing puzzle 'i'.
+        '''
+        entry = self.catalog.get(i)
+        if entry.game_state is None:
+            self.main.send_message(f'{entry.name} is not a valid puzzle: ' +
+                entry.error, 'red')
+            return
+        self.main.start_puzzle(entry.game_state.copy(), entry.text)
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def close(self):
+        if self.poll_task is not None:
+            self.window.after_cancel(self.poll_task)
+        self.catalog.close()
+        self.window.destroy()
+        self.main.browser = None
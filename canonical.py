@@ -0,0 +1,137 @@
+'''
+Canonical forms of game states.
+
+Moving a board, mirroring or rotating it, or renaming its colors does not
+change which moves are valid or whether it can be cleared. The canonical
+form picks one representative of all boards related this way, so caches and
+transposition tables can share results between them. A Transform records
+how a board maps to its canonical form, so that moves can be mapped back.
+'''
+
+import GameState as gs
+
+# Maps each of the 8 symmetries of a w x h box to a function of (x, y, w, h)
+# giving the new location
+SYMMETRIES = [
+    lambda x, y, w, h: (x, y),
+    lambda x, y, w, h: (w - 1 - x, y),
+    lambda x, y, w, h: (x, h - 1 - y),
+    lambda x, y, w, h: (w - 1 - x, h - 1 - y),
+    lambda x, y, w, h: (y, x),
+    lambda x, y, w, h: (h - 1 - y, x),
+    lambda x, y, w, h: (y, w - 1 - x),
+    lambda x, y, w, h: (h - 1 - y, w - 1 - x),
+]
+
+# Maps each symmetry to its inverse
+INVERSES = [0, 1, 2, 3, 4, 6, 5, 7]
+
+class Transform:
+    '''
+    Maps locations and colors of a board to those of its canonical form.
+    '''
+    def __init__(self, offset, symmetry, width, height, colors):
+        '''
+        Arguments:
+            offset: (x, y) of the top left corner of the board's bounding box
+            symmetry: index into SYMMETRIES
+            width, height: dimensions of the bounding box
+            colors: a dict mapping the board's colors to canonical colors
+        '''
+        self.offset = offset
+        self.symmetry = symmetry
+        self.width, self.height = width, height
+        self.colors = colors
+
+    def apply(self, loc):
+        '''
+        Returns the canonical location of the board location 'loc'.
+        '''
+        return SYMMETRIES[self.symmetry](loc[0] - self.offset[0],
+            loc[1] - self.offset[1], self.width, self.height)
+
+    def invert(self, loc):
+        '''
+        Returns the board location of the canonical location 'loc'.
+        '''
+        # The canonical bounding box is transposed by symmetries 4 to 7
+        if self.symmetry >= 4:
+            w, h = self.height, self.width
+        else:
+            w, h = self.width, self.height
+        x, y = SYMMETRIES[INVERSES[self.symmetry]](loc[0], loc[1], w, h)
+        return x + self.offset[0], y + self.offset[1]
+
+    def apply_moves(self, moves):
+        '''
+        Returns the list of board moves 'moves' in canonical locations.
+        '''
+        return [(self.apply(loc1), self.apply(loc2)) for loc1, loc2 in moves]
+
+    def invert_moves(self, moves):
+        '''
+        Returns the list of canonical moves 'moves' in board locations.
+        '''
+        return [(self.invert(loc1), self.invert(loc2)) for loc1, loc2 in moves]
+
+def _encode(squares):
+    '''
+    Arguments:
+        squares: a list of (loc, color_queue) pairs
+
+    Returns the key of 'squares' with colors renamed in order of first
+    appearance, and the dict of the new names.
+    '''
+    names = {}
+    parts = []
+    for loc, color_queue in sorted(squares):
+        for color in color_queue:
+            if color not in names:
+                names[color] = chr(ord('a') + len(names))
+        parts.append(f'{loc[0]},{loc[1]}:' +
+            ''.join(names[color] for color in color_queue))
+    return ' '.join(parts), names
+
+def canonical_form(game_state):
+    '''
+    Returns (key, transform), where 'key' is a string that is equal for two
+    game states exactly when one can be moved, mirrored, rotated and have
+    its colors renamed to give the other, and 'transform' maps 'game_state'
+    to the state described by 'key'.
+    '''
+    squares = game_state.key()
+    if not squares:
+        return '', Transform((0, 0), 0, 0, 0, {})
+
+    minx = min(loc[0] for loc, color_queue in squares)
+    miny = min(loc[1] for loc, color_queue in squares)
+    width = max(loc[0] for loc, color_queue in squares) - minx + 1
+    height = max(loc[1] for loc, color_queue in squares) - miny + 1
+
+    best = None
+    for symmetry, func in enumerate(SYMMETRIES):
+        key, names = _encode([(func(loc[0] - minx, loc[1] - miny, width,
+            height), color_queue) for loc, color_queue in squares])
+        if best is None or key < best[0]:
+            best = key, symmetry, names
+
+    key, symmetry, names = best
+    return key, Transform((minx, miny), symmetry, width, height, names)
+
+def canonical_key(game_state):
+    '''
+    Returns the key of canonical_form(game_state).
+    '''
+    return canonical_form(game_state)[0]
+
+def from_key(key):
+    '''
+    Returns a new GameState holding the canonical state described by 'key'.
+    '''
+    game_state = gs.GameState()
+    for square in key.split():
+        loc, colors = square.split(':')
+        x, y = loc.split(',')
+        for color in colors:
+            game_state.add((int(x), int(y)), color)
+    return game_state
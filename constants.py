@@ -1,4 +1,4 @@
-import math
+import math, os
 
 # Size of game window
 WINDOW_HEIGHT = 600
@@ -19,6 +19,9 @@ SPACING = 13
 # Max colors to show in a sqare
 MAX_COLORS = 4
 
+# Milliseconds between two frames of a canvas animation
+FRAME_DELAY = 15
+
 # How fast swapping takes place
 SWAP_SPEED = 5
 
@@ -26,9 +29,14 @@ ROTATION_SPEED = math.pi / 12
 SHRINK_FACTOR = 0.97
 REMOVE_TIME = 75
 
+# Most clicks and key presses kept while an animation runs, see
+# Application.process_input()
+MAX_QUEUED_INPUT = 32
+
 # Image file (has to be .gif) displayed in victory splash screen
 
-VICTORY_IMAGE = 'trophy.gif'
+VICTORY_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'trophy.gif')
 
 # How fast the vicotry image appears
 IMAGE_GROWTH_FACTOR = 5, 4
@@ -37,4 +45,43 @@ IMAGE_GROWTH_FACTOR = 5, 4
 TEXT_SPEED = 15
 
 # Max number of rows and columns allowed
-MAX_SIZE = 20
\ No newline at end of file
+MAX_SIZE = 20
+
+# Seconds a hint search may take
+HINT_TIME = 10
+
+# Milliseconds between checks for a finished hint search
+HINT_POLL = 50
+
+# Outline color of the squares suggested by a hint
+HINT_COLOR = 'gold'
+
+# Database of known puzzle solutions, consulted before searching for hints
+SOLUTION_CACHE = os.path.join(os.path.expanduser('~'), '.dissembler_cache.db')
+
+# Endgame tablebase written by endgame.py, consulted by hints and searches
+ENDGAME_TABLE = os.path.join(os.path.expanduser('~'),
+    '.dissembler_endgame.tb')
+
+# File remembering the last puzzle played and its moves, restored at startup
+STATE_FILE = os.path.join(os.path.expanduser('~'), '.dissembler_state.json')
+
+# Width in pixels of the outline of a highlighted square
+OUTLINE_WIDTH = 4
+
+# Most pre-rendered square images kept, see sprites.py
+SPRITE_CACHE_SIZE = 512
+
+# Size of the puzzle browser window, and height of one of its rows, in pixels
+BROWSER_WIDTH = 480
+BROWSER_HEIGHT = 600
+BROWSER_ROW_HEIGHT = 72
+
+# Most puzzles kept parsed by the puzzle browser
+BROWSER_CACHE_SIZE = 1024
+
+# Pages of puzzles below the visible ones prepared in the background
+BROWSER_PREFETCH_PAGES = 1
+
+# Milliseconds between checks for puzzles prepared in the background
+BROWSER_POLL = 50
@@ -1,12 +1,20 @@
-import math, cmath, random
+import time
+
+# Time at which the application started loading, for startup metrics
+START_TIME = time.perf_counter()
+
+import collections, json, math, cmath, os, random
 import tkinter as tk
-from tkinter.filedialog import askopenfilename
 from copy import deepcopy
 
 import GameState as gs
 import locset as ls
+import puzzle_io
+import replay
+import sprites
 from animator import Animator
 from constants import *
+from utils import puzzles
 
 class Application:
     '''
@@ -33,15 +41,51 @@ class Application:
         # Whether a game square has been clicked
         self.square_clicked = None
 
+        # Clicks, as ('click', loc) or ('click', None) outside of the
+        # squares, and key presses, as ('key', keysym), made during an
+        # animation, handled once it ends
+        self.input_queue = collections.deque(maxlen=MAX_QUEUED_INPUT)
+
+        # Pre-rendered images of squares, and the (signature, sprite) shown
+        # by the canvas item of each square
+        self.sprites = sprites.SpriteCache(self.game_canvas)
+        self.squares = {}
+
         # A GameState object
         self.game_state = gs.GameState()
         # A stack of game states, for the purpose of undoing moves
         self.state_stack = []
         # Number of moves made, undos do not reset
         self.moves = 0
-
-        self.send_message('Hello! To start playing, please load a puzzle file.'+
-            ' Many pre-built examples are included.' +
+        # The moves leading to the current game state, popped by undos
+        self.history = []
+        # The current puzzle in the text format, and its index in
+        # utils.puzzles if it is a bundled one
+        self.puzzle_text = None
+        self.puzzle_index = None
+
+        # Searches for hints in the background, created on first use
+        self.hint_engine = None
+        # The pending after() call polling for a hint
+        self.hint_task = None
+        # Answers hints for small boards at once, opened on first use, and
+        # None if it was not generated
+        self.endgame = None
+        self.endgame_opened = False
+
+        # The puzzle browser window, created on first use
+        self.browser = None
+
+        # The victory image, loaded on first use, see victory_image()
+        self._victory_image = None
+
+        self.master.protocol('WM_DELETE_WINDOW', self.quit)
+
+        if not self.restore_state():
+            self.load_bundled(0)
+
+        self.send_message('Hello! Pick a puzzle from the Puzzles menu, or ' +
+            'load a puzzle file. Many pre-built examples are included.' +
             ' For more info, such as keybinds, see readme.txt.')
 
     def mainloop(self):
@@ -92,7 +136,7 @@ class Application:
         width = int(self.menu_canvas['width'])
         height = int(self.menu_canvas['height'])
 
-        button_diameterx = int((width - 4 * (width / SPACING)) / 6)
+        button_diameterx = int((width - 5 * (width / SPACING)) / 8)
         button_diametery = int((height - 2 * (height / SPACING)) / 2)
 
         button_width = int(button_diameterx*113/400)
@@ -119,67 +163,36 @@ class Application:
             height / SPACING + button_diametery, window=restart_button,
             tag='restart')
 
+        puzzles_button = tk.Menubutton(self.master, text='Puzzles',
+            width=button_width, height=button_height, relief='raised')
+        puzzles_menu = tk.Menu(puzzles_button, tearoff=0)
+        puzzles_menu.add_command(label='Browse...', command=self.open_browser)
+        puzzles_menu.add_separator()
+        for i in range(len(puzzles)):
+            puzzles_menu.add_command(label=f'Puzzle {i + 1}',
+                command=lambda i=i: self.load_bundled(i))
+        puzzles_button['menu'] = puzzles_menu
+
+        self.menu_canvas.create_window(4*(width / SPACING) + 7*button_diameterx,
+            height / SPACING + button_diametery, window=puzzles_button,
+            tag='puzzles')
+
     def load(self, filename, game_state):
         '''
         Loads a dissembler file from 'filename' into 'game_state'.
 
         Returns the updated game state.
         ''' 
-        color_dict = {}
-
-        with open(filename, 'r') as file:
-            line = file.readline()
-
-            if file.readline():
-                raise IOError('The contents of the file need to be on one ' +
-                    'line. See readme.txt for more info on proper input.')
-
-            for r, row in enumerate(line.split(' ')):
-                if r > MAX_SIZE:
-                    raise IOError('The size of the puzzle is limited to '+
-                        f'{MAX_SIZE}.')
-
-                squares = []
-                it = iter(row)
-
-                for elem in it:
-                    if elem == '|':
-                        square = ''
-                        elem = next(it)
-                        try:
-                            while elem != '|':
-                                if elem == '.':
-                                    raise IOError('"." cannot be used inside' +
-                                        ' a pair of "|". See readme.txt ' + 
-                                        'for more info on proper input.')
-                                square += elem
-                                elem = next(it)
-                        except StopIteration as e:
-                            raise IOError('"|" symbols must be in pairs. ' + 
-                                'See readme.txt for more info on ' +
-                                'proper input.') from e
-
-                        squares.append(square)
-                    else:
-                        squares.append(elem)
-
-                for c, square in enumerate(squares):
-                    if c > MAX_SIZE:
-                        raise IOError('The size of the puzzle is limited to ' +
-                            f'{MAX_SIZE}.')
-                    for i in square:
-                        if i == '.':
-                            break
-                        if i not in color_dict:
-                            color_dict[i] = self.random_color()
-                        game_state.add((c, r), color_dict[i])
-
-        return game_state
+        return puzzle_io.load(filename, game_state,
+            lambda char: self.random_color())
 
     def prompt_load(self):
         '''
         Prompts the user to load a file.
         '''
+        # The file dialog module is only needed here
+        from tkinter.filedialog import askopenfilename
+
         filename = askopenfilename()
         if not filename:
             return
@@ -192,9 +205,48 @@ class Application:
                 'red')
             return
 
-        self.game_state = new_game_state
+        self.start_puzzle(new_game_state, puzzle_io.to_text(new_game_state))
+
+    def open_browser(self):
+        '''
+        Opens the puzzle browser, listing the bundled puzzles at first.
+        '''
+        if self.browser is not None:
+            self.browser.lift()
+            return
+
+        # Deferred, as it pulls in the analyzer and a thread pool
+        import browser
+        self.browser = browser.PuzzleBrowser(self, browser.Catalog.bundled())
+
+    def load_bundled(self, index):
+        '''
+        Arguments:
+            index: an index into utils.puzzles, wrapping around
+
+        Starts playing the bundled puzzle 'index'.
+        '''
+        index %= len(puzzles)
+        game_state = puzzle_io.parse(puzzles[index], gs.GameState(),
+            lambda char: self.random_color())
+        self.start_puzzle(game_state, puzzles[index], index)
+
+    def start_puzzle(self, game_state, text, index=None):
+        '''
+        Arguments:
+            game_state: the GameState of a newly loaded puzzle
+            text: the puzzle in the text format
+            index: its index in utils.puzzles, if it is a bundled puzzle
+
+        Starts playing 'game_state' from the beginning.
+        '''
+        self.cancel_hint()
+        self.game_state = game_state
         self.state_stack = []
+        self.history = []
         self.moves = 0
+        self.puzzle_text = text
+        self.puzzle_index = index
 
         self.state_stack.append(deepcopy(self.game_state))
 
@@ -202,6 +254,65 @@ class Application:
         self.animator.cancel_text_animation(self.display_text)
         self.animator.cancel_animation()
         self.draw_game_state()
+        self.check_victory()
+        self.save_state()
+
+    def save_state(self):
+        '''
+        Writes the current puzzle and the moves made on it to STATE_FILE.
+        '''
+        if self.puzzle_text is None:
+            return
+
+        try:
+            with open(STATE_FILE, 'w') as file:
+                json.dump({'puzzle': self.puzzle_text,
+                    'index': self.puzzle_index,
+                    'moves': [replay.format_move(move)
+                        for move in self.history]}, file)
+        except OSError:
+            # Not being able to remember the puzzle is no reason to stop
+            pass
+
+    def restore_state(self):
+        '''
+        Resumes the puzzle saved in STATE_FILE, replaying its moves. Returns
+        whether there was a puzzle to resume.
+        '''
+        try:
+            with open(STATE_FILE) as file:
+                state = json.load(file)
+            game_state = puzzle_io.parse(state['puzzle'], gs.GameState(),
+                lambda char: self.random_color())
+            moves = [replay.parse_move(move) for move in state['moves']]
+        except (OSError, ValueError, KeyError, TypeError, StopIteration):
+            return False
+
+        index = state.get('index')
+        self.start_puzzle(game_state, state['puzzle'],
+            index if isinstance(index, int) else None)
+
+        for move in moves:
+            if not self.game_state.is_move_valid(*move):
+                break
+            self.game_state.make_move(*move)
+            self.state_stack.append(deepcopy(self.game_state))
+            self.history.append(move)
+            self.moves += 1
+
+        if self.history:
+            self.draw_game_state()
+            self.check_victory()
+        return True
+
+    def quit(self):
+        '''
+        Saves the current puzzle and closes the window.
+        '''
+        self.save_state()
+        if self.browser is not None:
+            self.browser.close()
+        self.master.destroy()
                        
     def random_color(self):
         """
@@ -218,13 +329,17 @@ class Application:
 
     def draw_game_state(self):
         '''
-        Draws the current game state to the game canvas.
+        Draws the current game state to the game canvas, each square as one
+        image from the sprite cache.
         '''
         self.game_canvas.delete('all')
+        self.squares = {}
 
         space_size, x, y = self.get_drawing_dimensions()
 
+        self.space_size = space_size
         self.spacing = space_size / SPACING
+        self.sprites.resize(space_size)
 
         for loc in self.game_state:
             tag = f'{loc[0]}+{loc[1]}'
@@ -233,21 +348,13 @@ class Application:
                 color_queue = self.game_state[loc]
             except KeyError:
                 continue
-            
-            colored_squares = []
-            for i, color in enumerate(color_queue):
-                if i > 3:
-                    # Colors beyond the 4th appear as black
-                    color = 'black'
-
-                if i == 0:
-                    modified_tag = (tag, 'outside')
-                else:
-                    modified_tag = tag
-                self.draw_square_in_grid(self.game_canvas, space_size, 
-                    *self.loc_to_coord(loc), 
-                    color, modified_tag,
-                    self.spacing + i*(0.25*(space_size/2 - self.spacing - 3)))
+            if not color_queue:
+                continue
+
+            coordx, coordy = self.loc_to_coord(loc)
+            item = self.game_canvas.create_image(coordx + space_size / 2,
+                coordy + space_size / 2, tags=(tag, 'square'))
+            self.show_sprite(item, sprites.stack_signature(color_queue))
 
             self.game_canvas.tag_bind(tag, '<Enter>', 
                 lambda event, tag=tag: self.on_square_hover(event, tag))
@@ -261,6 +368,41 @@ class Application:
         self.game_canvas.create_text(self.width - FONT[1]*4, 
             FONT[1], font=FONT, text=f'Moves: {self.moves}')
 
+    def show_sprite(self, item, signature, outline=None):
+        '''
+        Arguments:
+            item: the canvas item of a square
+            signature: the sprites.stack_signature() of the square
+            outline: the color to outline the square with, or None
+
+        Shows the sprite of the square as canvas 'item'.
+        '''
+        sprite = self.sprites.get(signature, outline)
+        # Keeps the sprite alive while shown, even once evicted from the cache
+        self.squares[item] = signature, sprite
+        self.game_canvas.itemconfig(item, image=sprite)
+
+    def outline_square(self, item, color=None):
+        '''
+        Outlines the square of canvas 'item' with 'color', or removes its
+        outline if None.
+        '''
+        if item in self.squares:
+            self.show_sprite(item, self.squares[item][0], color)
+
+    def square_at(self, loc):
+        '''
+        Returns the canvas item of the square shown at 'loc', or None.
+        '''
+        coordx, coordy = self.loc_to_coord(loc)
+        centerx = coordx + self.space_size / 2
+        centery = coordy + self.space_size / 2
+        for item in self.game_canvas.find_overlapping(centerx, centery,
+        centerx, centery):
+            if item in self.squares:
+                return item
+        return None
+
     def get_drawing_dimensions(self):
         '''
         Computes the rectangular grid where the squares in the dissembler
@@ -319,7 +461,7 @@ class Application:
             (x + spacing, y + space_size - spacing),
             (x + space_size - spacing, y + space_size - spacing), 
             (x + space_size - spacing, y + spacing)], 
-            fill=color, outline='', width=4, tags=tag)
+            fill=color, outline='', width=OUTLINE_WIDTH, tags=tag)
 
     def loc_to_coord(self, loc):
         '''
@@ -350,8 +492,8 @@ class Application:
         row = (coord[0] - x) // space_size
         col = (coord[1] - y) // space_size
 
-        row -= self.game_state.minrow
-        col -= self.game_state.mincol
+        row += self.game_state.minrow
+        col += self.game_state.mincol
 
         return int(row), int(col)
 
@@ -370,15 +512,12 @@ class Application:
         if self.animator.animating:
             return
 
-        tag_squres = event.widget.find_withtag(tag)
-        outside_squares = event.widget.find_withtag('outside')
-
-        item = set(tag_squres).intersection(outside_squares).pop()
+        item = event.widget.find_withtag(tag)[0]
 
         if event.type == '7':  # Enter
-            event.widget.itemconfig(item, outline='black', width=4)
+            self.outline_square(item, 'black')
         elif event.type == '8': # Leave
-            event.widget.itemconfig(item, outline='', width=4)
+            self.outline_square(item)
 
     def on_square_click(self, event, tag):
         '''
@@ -386,14 +525,24 @@ class Application:
         by the mouse.
         '''
         if self.animator.animating:
+            self.input_queue.append(('click',
+                self.coord_to_loc((event.x, event.y))))
             return
 
-        tag_squres = event.widget.find_withtag(tag)
-        outside_squares = event.widget.find_withtag('outside')
+        self.click_square(event.widget.find_withtag(tag)[0], tag,
+            self.coord_to_loc((event.x, event.y)))
 
-        item = set(tag_squres).intersection(outside_squares).pop()
+    def click_square(self, item, tag, loc):
+        '''
+        Arguments:
+            item: the canvas item of the clicked square
+            tag: the tag of the square
+            loc: the location of the square
 
-        event.widget.itemconfig(item, outline='black', width=4)
+        Selects the square, or makes the move swapping it with the selected
+        one.
+        '''
+        self.outline_square(item, 'black')
 
         if not self.square_clicked:
             self.square_clicked = tag, item
@@ -403,54 +552,103 @@ class Application:
 
         loc1 = self.coord_to_loc(self.game_canvas.coords(
             self.square_clicked[1])[:2])
-        loc2 = self.coord_to_loc((event.x, event.y))
+        loc2 = loc
 
         try:
             removed = self.game_state.make_move(loc1, loc2)
         except ValueError:
             self.send_message(self.get_swap_error_msg(loc1, loc2), 'red')
         else:
+            self.cancel_hint()
             self.on_swap(self.square_clicked[0], tag, loc1, loc2, removed)
             game_state_copy = deepcopy(self.game_state)
             self.state_stack.append(game_state_copy)
+            self.history.append((loc1, loc2))
 
     def on_game_click(self, event):
         '''
         A callback function called when the mouse is clicked inside the game
         canvas.
         '''
-        if not self.square_clicked or self.animator.animating:
+        if event.widget.find_overlapping(event.x, event.y, 
+            event.x, event.y):
+            # Handled by on_square_click()
             return
 
-        if not event.widget.find_overlapping(event.x, event.y, 
-            event.x, event.y):
+        if self.animator.animating:
+            self.input_queue.append(('click', None))
+        elif self.square_clicked:
             item = self.square_clicked[1]
-            event.widget.itemconfig(item, outline='')
+            self.outline_square(item)
             self.square_clicked = None
 
     def key_handler(self, event):
-        if event.keysym == 'u':
+        if self.animator.animating and event.keysym != 'q':
+            self.input_queue.append(('key', event.keysym))
+            return
+
+        self.handle_key(event.keysym)
+
+    def handle_key(self, keysym):
+        if keysym == 'u':
             self.undo_move()
 
-        elif event.keysym == 'l':
+        elif keysym == 'l':
             self.prompt_load()
 
-        elif event.keysym == 'r':
+        elif keysym == 'r':
             self.restart()
 
-        elif event.keysym == 'q':
-            self.master.destroy()
+        elif keysym == 'h':
+            self.request_hint()
+
+        elif keysym == 'b':
+            self.open_browser()
+
+        elif keysym == 'n':
+            self.load_bundled(0 if self.puzzle_index is None
+                else self.puzzle_index + 1)
+
+        elif keysym == 'p':
+            self.load_bundled(-1 if self.puzzle_index is None
+                else self.puzzle_index - 1)
+
+        elif keysym == 'q':
+            self.quit()
+
+    def process_input(self):
+        '''
+        Handles the input queued during the animation that just ended, until
+        one of them starts another animation. Moves are checked against the
+        game state reached, like clicks made after the animation.
+        '''
+        while self.input_queue and not self.animator.animating:
+            kind, value = self.input_queue.popleft()
+            if kind == 'key':
+                self.handle_key(value)
+                continue
+
+            item = None if value is None else self.square_at(value)
+            if item is not None:
+                self.click_square(item, self.game_canvas.gettags(item)[0],
+                    value)
+            elif self.square_clicked:
+                # Clicked outside of the squares
+                self.outline_square(self.square_clicked[1])
+                self.square_clicked = None
 
     def undo_move(self):
         '''
         Reverts the game state to the previous state on the game_stack.
         '''
+        self.cancel_hint()
         self.animator.cancel_animation()
         self.animator.cancel_text_animation(self.display_text)
 
         try:
             self.game_state = deepcopy(self.state_stack[-2])
             self.state_stack.pop()
+            self.history.pop()
         except IndexError:
             # Nothing to undo
             return
@@ -463,13 +661,94 @@ class Application:
         '''
         self.moves = 0
 
+        self.cancel_hint()
         self.animator.cancel_animation()
         self.animator.cancel_text_animation(self.display_text)
 
         self.game_state = self.state_stack[0]
         self.state_stack = [deepcopy(self.game_state)]
+        self.history = []
         self.draw_game_state()
 
+    def request_hint(self):
+        '''
+        Starts searching for a good next move in the background. The result
+        is shown once found, see poll_hint(). Boards in the endgame table
+        are answered at once.
+        '''
+        if not self.game_state or self.animator.animating:
+            return
+
+        if not self.endgame_opened:
+            # Deferred, as it maps the table file and pulls in hashlib
+            import endgame
+            self.endgame = endgame.open_table(ENDGAME_TABLE)
+            self.endgame_opened = True
+
+        entry = self.endgame.probe(self.game_state) if self.endgame else None
+        if entry is not None:
+            self.cancel_hint()
+            distance, move = entry
+            self.show_hint(('unsolvable', None) if distance is None
+                else ('move', move))
+            return
+
+        if self.hint_engine is None:
+            # Deferred, as it pulls in multiprocessing and sqlite3
+            import hint
+            self.hint_engine = hint.HintEngine()
+
+        self.hint_engine.start(self.game_state, HINT_TIME, SOLUTION_CACHE,
+            ENDGAME_TABLE if self.endgame else None)
+        self.send_message('Looking for a hint...')
+
+        if self.hint_task is None:
+            self.hint_task = self.master.after(HINT_POLL, self.poll_hint)
+
+    def poll_hint(self):
+        '''
+        Checks whether the hint search has finished, and shows its result if
+        so. Called periodically from the tkinter event loop while searching.
+        '''
+        self.hint_task = None
+        result = self.hint_engine.poll()
+
+        if result is None:
+            if self.hint_engine.running():
+                self.hint_task = self.master.after(HINT_POLL, self.poll_hint)
+            return
+
+        self.show_hint(result)
+
+    def show_hint(self, result):
+        '''
+        Shows 'result', as returned by HintEngine.poll().
+        '''
+        kind, move = result
+        if kind == 'move':
+            for loc in move:
+                tag = f'{loc[0]}+{loc[1]}'
+                for item in self.game_canvas.find_withtag(tag):
+                    self.outline_square(item, HINT_COLOR)
+            self.send_message('Hint: swap the highlighted squares.')
+        elif kind == 'unsolvable':
+            self.send_message('This position can no longer be won. ' +
+                'Undo or restart to try again.', 'red')
+        elif kind == 'timeout':
+            self.send_message('Could not find a hint in time, sorry!', 'red')
+        else:
+            self.send_message('Something went wrong finding a hint.', 'red')
+
+    def cancel_hint(self):
+        '''
+        Stops looking for a hint, if a search is in progress.
+        '''
+        if self.hint_engine is not None:
+            self.hint_engine.cancel()
+        if self.hint_task is not None:
+            self.master.after_cancel(self.hint_task)
+            self.hint_task = None
+
     def send_message(self, msg, color='black'):
         '''
         Arguments:
@@ -525,16 +804,31 @@ class Application:
         that are needed after a swap.
         '''
         # Unclick
-        self.game_canvas.itemconfig(tag1, outline='')
-        self.game_canvas.itemconfig(tag2, outline='')
+        for item in self.game_canvas.find_withtag(tag1) + \
+        self.game_canvas.find_withtag(tag2):
+            self.outline_square(item)
         self.square_clicked = None
 
         self.animator.animate_removal(removed, 0)
 
+    def victory_image(self):
+        '''
+        Returns the image shown when the game is won, loading it on first
+        use.
+        '''
+        if self._victory_image is None:
+            self._victory_image = tk.PhotoImage(
+                file=VICTORY_IMAGE).subsample(50)
+        return self._victory_image
+
     def check_victory(self):
         '''
         If the game has been won, activate the victory splash screen.
+        Otherwise, tells the player if the board can no longer be cleared.
         '''
+        if self.game_state and self.game_state.is_dead():
+            self.send_message('This position can no longer be won. ' +
+                'Undo or restart to try again.', 'red')
 
         if not self.game_state:
             self.game_canvas.delete('all')
@@ -542,17 +836,10 @@ class Application:
             x = int(self.game_canvas['width']) / 2
             y = int(self.game_canvas['height']) / 2
 
-            victory_image = tk.PhotoImage(file=VICTORY_IMAGE)
-
-            width = victory_image.width()
-            height = victory_image.height()
+            victory_image = self.victory_image()
 
-            largest_dim = max(width, height)
             smallest_window = min(x*2, y*2)
 
-            scaling_factor = int(largest_dim / smallest_window) + 1
-            victory_image = victory_image.subsample(50)
-
             self.game_canvas.image = victory_image
             self.game_canvas.create_image(x, y, image=victory_image, 
                 tag='photo')
@@ -562,6 +849,20 @@ class Application:
                 font=('Courier', 44))
 
 
-root = tk.Tk()
-app = Application(root)
-app.mainloop()
\ No newline at end of file
+if __name__ == '__main__':
+    # Set to a file path to record performance metrics of the session there
+    metrics_file = os.environ.get('DISSEMBLER_METRICS')
+    if metrics_file:
+        import instrument
+        instrument.enable()
+        instrument.wrap(Application, 'draw_game_state')
+
+    root = tk.Tk()
+    app = Application(root)
+    if metrics_file:
+        root.after_idle(lambda: instrument.record_time('startup',
+            time.perf_counter() - START_TIME))
+    app.mainloop()
+
+    if metrics_file:
+        instrument.dump(metrics_file)
\ No newline at end of file
@@ -0,0 +1,327 @@
+'''
+An endgame tablebase: the exact value of every small dissembler board.
+
+The generator enumerates every board of at most max_cells squares fitting a
+width x height box, up to max_layers layers in all, that GameState.is_dead()
+does not already rule out. Boards are normalized by their canonical form
+(see canonical.py), and solved in order of their number of layers: every
+move strips layers and keeps the squares within the box, so all the
+successors of a board are solved before it. A board's entry holds the
+fewest moves that clear it, or UNSOLVABLE, and the first of those moves.
+
+The table is written as a file of fixed-size slots, an open-addressing hash
+table keyed by a 64-bit hash of the canonical key, so that it is memory
+mapped instead of read, and looked up in constant time.
+
+    python endgame.py --out endgame.tb --width 3 --height 3 --max-layers 8
+'''
+
+import argparse, hashlib, itertools, mmap, os, struct, sys, time
+
+import GameState as gs
+from canonical import canonical_form, from_key
+from constants import ENDGAME_TABLE
+
+DEFAULT_WIDTH = DEFAULT_HEIGHT = 3
+DEFAULT_MAX_CELLS = 9
+DEFAULT_MAX_LAYERS = 8
+
+# Distance of a board that cannot be cleared
+UNSOLVABLE = 255
+
+# Most slots used per slot of the table
+LOAD_FACTOR = 0.5
+
+MAGIC = b'DSEG'
+VERSION = 1
+
+# Magic, version, width, height, max_cells, max_layers, number of slots and
+# of entries
+_HEADER = struct.Struct('<4sBBBBB3xQQ4x')
+
+# Hash of the canonical key, distance, and first move as x, y and whether
+# it swaps downwards rather than to the right
+_ENTRY = struct.Struct('<QBBBB')
+
+def key_hash(key):
+    '''
+    Returns the non-zero 64-bit hash of the canonical key 'key'.
+    '''
+    digest = hashlib.blake2b(key.encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), 'little') or 1
+
+def _colorings(heights):
+    '''
+    Yields every tuple of colors, numbered in order of first appearance,
+    of the layers of squares of 'heights' layers in turn, for which
+    GameState.is_dead() is false: every color has at least three times as
+    many layers in all as any square holds of it.
+    '''
+    # Square of each layer
+    squares = [i for i, height in enumerate(heights) for _ in range(height)]
+    total = len(squares)
+    colors = [0] * total
+    counts = []
+
+    def place(i, missing):
+        '''
+        Colors the layers from 'i' on, given that the colors so far lack
+        'missing' layers to have three each.
+        '''
+        if i == total:
+            depths = {}
+            for square, color in zip(squares, colors):
+                depths[color, square] = depths.get((color, square), 0) + 1
+            if all(3 * depth <= counts[color]
+            for (color, square), depth in depths.items()):
+                yield tuple(colors)
+            return
+
+        left = total - i - 1
+        for color in range(len(counts)):
+            still = missing - (counts[color] < 3)
+            if still <= left:
+                colors[i] = color
+                counts[color] += 1
+                yield from place(i + 1, still)
+                counts[color] -= 1
+        if missing + 2 <= left:
+            colors[i] = len(counts)
+            counts.append(1)
+            yield from place(i + 1, missing + 2)
+            counts.pop()
+
+    yield from place(0, 0)
+
+def boards(width, height, max_cells, layers):
+    '''
+    Yields the canonical key of every board with 'layers' layers in all, of
+    at most 'max_cells' squares in a 'width' x 'height' box, that is not
+    already dead, each once.
+    '''
+    box = [(x, y) for y in range(height) for x in range(width)]
+    seen = set()
+
+    for cells in range(1, min(max_cells, layers) + 1):
+        for locs in itertools.combinations(box, cells):
+            # Others are moved copies
+            if min(x for x, y in locs) or min(y for x, y in locs):
+                continue
+            for cuts in itertools.combinations(range(1, layers), cells - 1):
+                heights = [b - a for a, b in
+                    zip((0,) + cuts, cuts + (layers,))]
+                for colors in _colorings(heights):
+                    game_state = gs.GameState()
+                    it = iter(colors)
+                    for loc, height in zip(locs, heights):
+                        for _ in range(height):
+                            game_state.add(loc, chr(ord('a') + next(it)))
+                    key = canonical_form(game_state)[0]
+                    if key not in seen:
+                        seen.add(key)
+                        yield key
+
+def generate(width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT,
+max_cells=DEFAULT_MAX_CELLS, max_layers=DEFAULT_MAX_LAYERS, progress=None):
+    '''
+    Arguments:
+        width, height, max_cells, max_layers: the boards to solve, see the
+        module docstring
+        progress: a function called with (layers, boards) once the boards
+        with each number of layers are solved, or None
+
+    Returns a dict mapping the key_hash() of every board to (distance,
+    move), where 'move' is the first move of a shortest solution in
+    canonical locations, or None if there is none.
+    '''
+    table = {}
+
+    for layers in range(3, max_layers + 1):
+        found = 0
+        for key in boards(width, height, max_cells, layers):
+            found += 1
+            game_state = from_key(key)
+
+            best = None
+            for move in game_state.legal_moves():
+                successor = game_state.successor(move)
+                if not successor:
+                    distance = 0
+                elif successor.is_dead():
+                    continue
+                else:
+                    distance = table[key_hash(canonical_form(successor)[0])][0]
+                    if distance == UNSOLVABLE:
+                        continue
+                if best is None or distance + 1 < best[0]:
+                    best = distance + 1, move
+
+            table[key_hash(key)] = best or (UNSOLVABLE, None)
+
+        if progress is not None:
+            progress(layers, found)
+
+    return table
+
+def write(path, table, width, height, max_cells, max_layers):
+    '''
+    Writes the result of generate() to the file 'path'.
+    '''
+    slots = 1
+    while slots * LOAD_FACTOR < max(len(table), 1):
+        slots *= 2
+
+    data = bytearray(_HEADER.size + slots * _ENTRY.size)
+    _HEADER.pack_into(data, 0, MAGIC, VERSION, width, height, max_cells,
+        max_layers, slots, len(table))
+    taken = bytearray(slots)
+
+    for hash, (distance, move) in table.items():
+        slot = hash % slots
+        while taken[slot]:
+            slot = (slot + 1) % slots
+        taken[slot] = 1
+
+        if move is None:
+            x = y = down = 0
+        else:
+            (x, y), (x2, y2) = move
+            down = y2 > y
+        _ENTRY.pack_into(data, _HEADER.size + slot * _ENTRY.size, hash,
+            distance, x, y, down)
+
+    with open(path, 'wb') as file:
+        file.write(data)
+
+class Tablebase:
+    '''
+    A table written by write(), memory mapped for lookups.
+    '''
+    def __init__(self, path=ENDGAME_TABLE):
+        '''
+        Raises OSError if 'path' cannot be read, and ValueError if it is not
+        a table.
+        '''
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.width, self.height, self.max_cells, \
+                self.max_layers, self.slots, self.entries = \
+                _HEADER.unpack_from(self.data)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION or \
+        len(self.data) != _HEADER.size + self.slots * _ENTRY.size:
+            self.data.close()
+            raise ValueError(f'{path} is not an endgame table')
+
+    def covers(self, game_state):
+        '''
+        Returns whether 'game_state' is small enough to be in the table.
+        '''
+        if sum(game_state.color_layers.values()) > self.max_layers:
+            return False
+
+        locs = [loc for loc, color_queue in game_state.loc_to_color.items()
+            if color_queue]
+        if len(locs) > self.max_cells:
+            return False
+        w = max(x for x, y in locs) - min(x for x, y in locs) + 1 if locs \
+            else 0
+        h = max(y for x, y in locs) - min(y for x, y in locs) + 1 if locs \
+            else 0
+        return (w <= self.width and h <= self.height) or \
+            (w <= self.height and h <= self.width)
+
+    def probe(self, game_state):
+        '''
+        Returns None if 'game_state' is not in the table. Otherwise returns
+        (distance, move): the fewest moves that clear it and the first of
+        them, or (None, None) if it cannot be cleared.
+        '''
+        if not game_state:
+            return 0, None
+        if not self.covers(game_state):
+            return None
+        if game_state.is_dead():
+            return None, None
+
+        key, transform = canonical_form(game_state)
+        hash = key_hash(key)
+        slot = hash % self.slots
+        while True:
+            stored, distance, x, y, down = _ENTRY.unpack_from(self.data,
+                _HEADER.size + slot * _ENTRY.size)
+            if stored == hash:
+                break
+            if not stored:
+                return None
+            slot = (slot + 1) % self.slots
+
+        if distance == UNSOLVABLE:
+            return None, None
+        other = (x, y + 1) if down else (x + 1, y)
+        return distance, (transform.invert((x, y)), transform.invert(other))
+
+    def solve(self, game_state):
+        '''
+        Returns a shortest list of moves that clears 'game_state', or None
+        if it cannot be cleared. Raises KeyError if it is not in the table.
+        '''
+        entry = self.probe(game_state)
+        if entry is None:
+            raise KeyError('Board not in the endgame table')
+        if entry[0] is None:
+            return None
+
+        moves = []
+        while game_state:
+            move = self.probe(game_state)[1]
+            moves.append(move)
+            game_state = game_state.successor(move)
+        return moves
+
+    def close(self):
+        self.data.close()
+
+def open_table(path=ENDGAME_TABLE):
+    '''
+    Returns the Tablebase at 'path', or None if there is none to read.
+    '''
+    try:
+        return Tablebase(path)
+    except (OSError, ValueError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--out', default=ENDGAME_TABLE,
+        help=f'file to write the table to (default: {ENDGAME_TABLE})')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH,
+        help=f'width of the box of the boards (default: {DEFAULT_WIDTH})')
+    parser.add_argument('--height', type=int, default=DEFAULT_HEIGHT,
+        help=f'height of the box of the boards (default: {DEFAULT_HEIGHT})')
+    parser.add_argument('--max-cells', type=int, default=DEFAULT_MAX_CELLS,
+        help=f'most squares of a board (default: {DEFAULT_MAX_CELLS})')
+    parser.add_argument('--max-layers', type=int, default=DEFAULT_MAX_LAYERS,
+        help=f'most layers of a board (default: {DEFAULT_MAX_LAYERS})')
+    args = parser.parse_args(argv)
+
+    if max(args.width, args.height) > 255 or args.max_layers > 255:
+        parser.error('The box and the number of layers must fit in a byte')
+
+    start = time.perf_counter()
+    table = generate(args.width, args.height, args.max_cells,
+        args.max_layers, lambda layers, found:
+        print(f'{layers:>3} layers: {found} boards'))
+    write(args.out, table, args.width, args.height, args.max_cells,
+        args.max_layers)
+
+    solvable = sum(distance != UNSOLVABLE for distance, move in table.values())
+    print(f'{len(table)} boards, {solvable} solvable, written to ' +
+        f'{args.out} ({os.path.getsize(args.out)} bytes) in ' +
+        f'{time.perf_counter() - start:.1f}s')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+'''
+Exhaustive exploration of the state graph of a dissembler puzzle, for
+puzzles whose graph does not fit in memory.
+
+States are encoded as fixed-size byte strings and grouped by their number
+of layers. Every move strips at least three layers, so a state is only
+reached from states with more layers: handling the groups from the most
+layers down, all the ways into a state are known before it is expanded.
+States are therefore found in exactly one group, where duplicates are
+merged by adding up their numbers of paths from the puzzle, without any
+visited set.
+
+Found states are buffered in memory. Once the buffer holds max_buffered
+states, every group is written to disk as a sorted run, and the runs of a
+group are merged when its turn comes, streaming its states one at a time.
+
+Computed are the number of states, edges and dead ends, the number of
+states at each depth (fewest moves from the puzzle), the number of move
+sequences that clear the board and the fewest moves that do, as in
+analyzer.py.
+
+    python explorer.py puzzle.txt --max-buffered 100000
+'''
+
+import argparse, heapq, os, sys, tempfile
+from collections import Counter
+
+import GameState as gs
+import locset as ls
+import puzzle_io
+
+DEFAULT_MAX_BUFFERED = 1000000
+
+# Bytes of the number of paths and of the depth in a record
+PATHS_SIZE = 16
+DEPTH_SIZE = 2
+
+# Records read from a run at a time
+READ_CHUNK = 4096
+
+class Codec:
+    '''
+    Encodes the states reachable from one puzzle as byte strings of equal
+    length: for each non-empty location of the puzzle, in order, its colors
+    from the top as indices into a palette, padded with zeros.
+    '''
+    def __init__(self, game_state):
+        '''
+        Arguments:
+            game_state: the GameState of the puzzle
+        '''
+        self.locs = sorted(loc for loc, color_queue
+            in game_state.loc_to_color.items() if color_queue)
+        self.depth = max((len(game_state.loc_to_color[loc])
+            for loc in self.locs), default=0)
+        self.palette = sorted(set(color for loc in self.locs
+            for color in game_state.loc_to_color[loc]))
+        if len(self.palette) > 255:
+            raise ValueError('Too many colors!')
+        self.ids = {color: i + 1 for i, color in enumerate(self.palette)}
+        self.size = len(self.locs) * self.depth
+
+    def encode(self, game_state):
+        '''
+        Returns the byte string of 'game_state'.
+        '''
+        record = bytearray(self.size)
+        loc_to_color = game_state.loc_to_color
+        for i, loc in enumerate(self.locs):
+            color_queue = loc_to_color.get(loc)
+            if color_queue:
+                start = i * self.depth
+                record[start:start + len(color_queue)] = \
+                    bytes(self.ids[color] for color in color_queue)
+        return bytes(record)
+
+    def decode(self, record):
+        '''
+        Returns a new GameState holding the state of the byte string
+        'record'.
+        '''
+        game_state = gs.GameState()
+        for i, loc in enumerate(self.locs):
+            for color in record[i * self.depth:(i + 1) * self.depth]:
+                if not color:
+                    break
+                game_state.add(loc, self.palette[color - 1])
+        return game_state
+
+    def layers(self, record):
+        '''
+        Returns the number of layers of the state of 'record'.
+        '''
+        return self.size - record.count(0)
+
+class Explorer:
+    '''
+    Explores the state graph of one puzzle, see the module docstring.
+    '''
+    def __init__(self, game_state, max_buffered=DEFAULT_MAX_BUFFERED,
+    workdir=None):
+        '''
+        Arguments:
+            game_state: the GameState of the puzzle, not altered
+            max_buffered: most states held in memory before writing them to
+            disk
+            workdir: directory for the runs, by default the system's
+            temporary directory
+        '''
+        self.root = game_state.copy()
+        self.codec = Codec(self.root)
+        self.max_buffered = max_buffered
+        self.workdir = workdir
+
+        # Maps numbers of layers to a dict mapping records to
+        # [paths, depth]
+        self.buffers = {}
+        self.buffered = 0
+        # Maps numbers of layers to a list of run file paths
+        self.runs = {}
+        self.spills = 0
+
+    def _add(self, record, paths, depth):
+        buffer = self.buffers.setdefault(self.codec.layers(record), {})
+        entry = buffer.get(record)
+        if entry is None:
+            buffer[record] = [paths, depth]
+            self.buffered += 1
+            if self.buffered >= self.max_buffered:
+                self._spill()
+        else:
+            entry[0] += paths
+            if depth < entry[1]:
+                entry[1] = depth
+
+    def _spill(self):
+        '''
+        Writes every buffered group to a new sorted run.
+        '''
+        for layers, buffer in self.buffers.items():
+            path = os.path.join(self.tmpdir, f'{layers}-{self.spills}.run')
+            with open(path, 'wb') as file:
+                for record in sorted(buffer):
+                    paths, depth = buffer[record]
+                    file.write(record + paths.to_bytes(PATHS_SIZE, 'big') +
+                        depth.to_bytes(DEPTH_SIZE, 'big'))
+            self.runs.setdefault(layers, []).append(path)
+
+        self.buffers.clear()
+        self.buffered = 0
+        self.spills += 1
+
+    def _read_run(self, path):
+        '''
+        Yields the (record, paths, depth) of a run, in order.
+        '''
+        size = self.codec.size
+        entry_size = size + PATHS_SIZE + DEPTH_SIZE
+        with open(path, 'rb') as file:
+            while True:
+                chunk = file.read(entry_size * READ_CHUNK)
+                if not chunk:
+                    break
+                for start in range(0, len(chunk), entry_size):
+                    paths_end = start + size + PATHS_SIZE
+                    yield (chunk[start:start + size],
+                        int.from_bytes(chunk[start + size:paths_end], 'big'),
+                        int.from_bytes(chunk[paths_end:start + entry_size],
+                            'big'))
+        os.remove(path)
+
+    def _group(self, layers):
+        '''
+        Yields the (record, paths, depth) of every state with 'layers'
+        layers, once each, merging its runs and buffer.
+        '''
+        buffer = self.buffers.pop(layers, {})
+        self.buffered -= len(buffer)
+        sources = [self._read_run(path) for path in self.runs.pop(layers, [])]
+        sources.append((record, paths, depth)
+            for record, (paths, depth) in sorted(buffer.items()))
+
+        current = None
+        for record, paths, depth in heapq.merge(*sources):
+            if current is not None and current[0] == record:
+                current[1] += paths
+                current[2] = min(current[2], depth)
+                continue
+            if current is not None:
+                yield tuple(current)
+            current = [record, paths, depth]
+        if current is not None:
+            yield tuple(current)
+
+    def explore(self):
+        '''
+        Returns a dict of:
+            states, edges, dead_ends: as in analyzer.analyze()
+            depths: a dict mapping each depth to its number of states
+            solutions: number of move sequences that clear the board
+            min_solution_length: fewest moves that clear the board, None if
+            it cannot be cleared
+            spills: number of times the buffer was written to disk
+        '''
+        # The groups remembered for other puzzles are of no use for this one
+        ls.clear_group_cache()
+
+        codec = self.codec
+        states = edges = dead_ends = 0
+        depths = Counter()
+        solutions, min_solution_length = 0, None
+
+        with tempfile.TemporaryDirectory(dir=self.workdir) as self.tmpdir:
+            self._add(codec.encode(self.root), 1, 0)
+
+            # Groups only gain states with fewer layers than the one at hand
+            while self.buffers or self.runs:
+                layers = max(set(self.buffers) | set(self.runs))
+
+                for record, paths, depth in self._group(layers):
+                    states += 1
+                    depths[depth] += 1
+
+                    if not layers:
+                        solutions, min_solution_length = paths, depth
+                        continue
+
+                    game_state = codec.decode(record)
+                    if game_state.is_dead():
+                        dead_ends += 1
+                        continue
+
+                    moves = list(game_state.legal_moves())
+                    if not moves:
+                        dead_ends += 1
+                    edges += len(moves)
+
+                    for move in moves:
+                        diff = game_state.apply_move(*move)
+                        self._add(codec.encode(game_state), paths, depth + 1)
+                        game_state.revert(diff)
+
+        return {
+            'states': states,
+            'edges': edges,
+            'dead_ends': dead_ends,
+            'depths': dict(sorted(depths.items())),
+            'solutions': solutions,
+            'min_solution_length': min_solution_length,
+            'spills': self.spills,
+        }
+
+def explore(game_state, max_buffered=DEFAULT_MAX_BUFFERED, workdir=None):
+    '''
+    Returns Explorer(game_state, max_buffered, workdir).explore().
+    '''
+    return Explorer(game_state, max_buffered, workdir).explore()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('file', help='file holding the puzzle')
+    parser.add_argument('--max-buffered', type=int,
+        default=DEFAULT_MAX_BUFFERED,
+        help='most states kept in memory before spilling to disk ' +
+        f'(default: {DEFAULT_MAX_BUFFERED})')
+    parser.add_argument('--workdir',
+        help='directory for the spilled runs (default: system temp)')
+    args = parser.parse_args(argv)
+
+    result = explore(puzzle_io.load(args.file, gs.GameState()),
+        args.max_buffered, args.workdir)
+
+    length = result['min_solution_length']
+    print(f'states {result["states"]}  edges {result["edges"]}' +
+        f'  dead ends {result["dead_ends"]}' +
+        f'  solutions {result["solutions"]}' +
+        f'  shortest {"-" if length is None else length}' +
+        f'  spills {result["spills"]}')
+    for depth, count in result['depths'].items():
+        print(f'depth {depth:>3}: {count} states')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
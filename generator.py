@@ -0,0 +1,358 @@
+'''
+Generator of random dissembler puzzles that are guaranteed to be solvable.
+
+Puzzles are built by playing the game backwards from an empty board: each
+step puts a new color on top of one or two connected groups of three or
+more squares, then swaps two adjacent squares so that swapping them back
+recreates the groups. Every step is checked to leave no group behind, so
+playing the recorded moves forwards clears the board.
+
+    python generator.py 6 6 --colors 4 --depth 2 --count 1000 --seed 1
+
+writes 1000 puzzles in the text format, one per line. Each puzzle takes
+about a hundred backward steps in Python, so one process makes on the order
+of 700 6x6 or 300 10x10 puzzles per second with 4 colors and depth 2. The
+command line runs one worker process per core by default (--jobs), which is
+what brings it to thousands of puzzles per second on a multi-core machine.
+'''
+
+import argparse, itertools, multiprocessing, os, random, sys
+from collections import deque
+
+import GameState as gs
+import puzzle_io
+
+# Sizes of the groups created by one step, picked uniformly
+GROUP_SIZES = (3, 3, 3, 4, 4, 5)
+
+# Chance that a step creates two groups when it does not have to
+DOUBLE_CHANCE = 0.3
+
+# Number of failed steps in a row after which a puzzle is considered full
+MAX_FAILURES = 20
+
+# Number of boards started over before giving up on a puzzle that cannot
+# get the requested number of moves
+MAX_RESTARTS = 100
+
+# Number of puzzles made by one seeded generator, and per job
+CHUNK_SIZE = 100
+
+def _neighbors(loc):
+    x, y = loc
+    return (x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)
+
+def _group_size(board, neighbors, loc, limit=3):
+    '''
+    Returns the size of the group of the current color of 'loc' on 'board',
+    counting no further than 'limit'.
+    '''
+    tops = board.tops
+    color = tops[loc]
+    seen = {loc}
+    stack = [loc]
+    while stack and len(seen) < limit:
+        for n in neighbors[stack.pop()]:
+            if n not in seen and tops[n] == color:
+                seen.add(n)
+                stack.append(n)
+    return len(seen)
+
+class _Board:
+    '''
+    A board being built by a Generator. Lighter than a GameState, as it
+    keeps no color counts or location sets, only the stacks of the cells
+    and their current colors.
+    '''
+    __slots__ = ('stacks', 'tops')
+
+    def __init__(self, cells):
+        # Maps every cell to its colors, the current one last, and to its
+        # current color or None
+        self.stacks = {cell: [] for cell in cells}
+        self.tops = dict.fromkeys(cells)
+
+    def push(self, loc, color):
+        self.stacks[loc].append(color)
+        self.tops[loc] = color
+
+    def strip(self, loc):
+        stack = self.stacks[loc]
+        stack.pop()
+        self.tops[loc] = stack[-1] if stack else None
+
+    def swap(self, loc1, loc2):
+        stacks, tops = self.stacks, self.tops
+        stacks[loc1], stacks[loc2] = stacks[loc2], stacks[loc1]
+        tops[loc1], tops[loc2] = tops[loc2], tops[loc1]
+
+    def game_state(self):
+        '''
+        Returns the board as a new GameState.
+        '''
+        game_state = gs.GameState()
+        for loc, stack in self.stacks.items():
+            # add() puts colors under the ones already there
+            for color in reversed(stack):
+                game_state.add(loc, color)
+        return game_state
+
+class Generator:
+    '''
+    Generates solvable puzzles of a fixed size, color count and depth.
+    '''
+    def __init__(self, ncols, nrows, ncolors, depth, seed=None):
+        '''
+        Arguments:
+            ncols, nrows: dimensions of the board
+            ncolors: number of distinct colors, at least 2
+            depth: maximum number of colors stacked in one square
+            seed: seed of the random number generator
+        '''
+        if ncolors < 2:
+            raise ValueError('At least two colors are needed!')
+
+        self.ncols, self.nrows = ncols, nrows
+        self.cells = [(c, r) for r in range(nrows) for c in range(ncols)]
+        # Maps each cell to its neighbors on the board
+        self.neighbors = {cell: tuple(n for n in _neighbors(cell)
+            if 0 <= n[0] < ncols and 0 <= n[1] < nrows)
+            for cell in self.cells}
+        self.depth = depth
+        self.colors = [chr(ord('a') + i) for i in range(ncolors)]
+        self.rng = random.Random(seed)
+
+    def _grow_region(self, board, start, color, taken):
+        '''
+        Returns a random connected list of locations starting at 'start'
+        that avoids 'taken' and squares next to others of 'color', or None
+        if there is no room for one.
+        '''
+        size = self.rng.choice(GROUP_SIZES)
+        region = [start]
+        in_region = {start}
+        neighbors = self.neighbors
+        stacks, depth = board.stacks, self.depth
+
+        # Neighbors of the region, once per region square they touch. A
+        # rejected one stays rejected: the region only grows
+        frontier = list(neighbors[start])
+        while len(region) < size:
+            frontier = [n for n in frontier if n not in in_region and
+                n not in taken and len(stacks[n]) < depth and
+                not self._touches(board, n, color, in_region)]
+            if not frontier:
+                return None
+            loc = self.rng.choice(frontier)
+            region.append(loc)
+            in_region.add(loc)
+            frontier.extend(neighbors[loc])
+
+        return region
+
+    def _touches(self, board, loc, color, region):
+        '''
+        Returns whether a square next to 'loc' outside of 'region' has
+        'color' as its current color.
+        '''
+        tops = board.tops
+        for n in self.neighbors[loc]:
+            if tops[n] == color and n not in region:
+                return True
+        return False
+
+    def unplay(self, board):
+        '''
+        Arguments:
+            board: a _Board without any groups of three or more
+
+        Tries to play one random move backwards on 'board'. Returns the
+        move (loc1, loc2) that undoes the step if it succeeded, otherwise
+        None, in which case 'board' is left unchanged.
+        '''
+        rng = self.rng
+        stacks, depth = board.stacks, self.depth
+        x = rng.choice(self.cells)
+        if len(stacks[x]) >= depth:
+            return None
+
+        y = rng.choice(_neighbors(x))
+        if y not in stacks:
+            return None
+
+        # The square swapped with a single group must not be empty
+        double = board.tops[y] is None or rng.random() < DOUBLE_CHANCE
+        if double and len(stacks[y]) >= depth:
+            return None
+
+        color1 = rng.choice(self.colors)
+        if self._touches(board, x, color1, {y} if double else ()):
+            return None
+        region1 = self._grow_region(board, x, color1, {y})
+        if region1 is None:
+            return None
+        groups = [(color1, region1)]
+
+        if double:
+            color2 = rng.choice([c for c in self.colors if c != color1])
+            region2 = self._grow_region(board, y, color2, set(region1))
+            if region2 is None:
+                return None
+            groups.append((color2, region2))
+
+        for color, region in groups:
+            for loc in region:
+                board.push(loc, color)
+
+        if self._isolated(board, groups):
+            board.swap(x, y)
+            if self._stable(board, groups, y):
+                return x, y
+            board.swap(x, y)
+
+        for color, region in groups:
+            for loc in region:
+                board.strip(loc)
+
+        return None
+
+    def _isolated(self, board, groups):
+        '''
+        Returns whether each group is a whole connected color group, i.e.
+        no square next to it has the same color.
+        '''
+        for color, region in groups:
+            if any(self._touches(board, loc, color, region)
+            for loc in region):
+                return False
+        return True
+
+    def _stable(self, board, groups, y):
+        '''
+        Returns whether none of the changed squares is in a group of three
+        or more.
+        '''
+        neighbors = self.neighbors
+        for color, region in groups:
+            for loc in region:
+                if _group_size(board, neighbors, loc) >= 3:
+                    return False
+        return _group_size(board, neighbors, y) < 3
+
+    def generate(self, moves=None):
+        '''
+        Arguments:
+            moves: number of moves to play backwards, defaults to as many as
+            fit on the board
+
+        Returns (game_state, solution), where 'solution' is a list of moves
+        that clears 'game_state', of 'moves' moves if given and at least one
+        otherwise. Boards that fill up too early are started over. Raises
+        ValueError if that fails MAX_RESTARTS times in a row.
+        '''
+        for _ in range(MAX_RESTARTS):
+            board = _Board(self.cells)
+            solution = []
+            failures = 0
+
+            while failures < MAX_FAILURES and \
+            (moves is None or len(solution) < moves):
+                move = self.unplay(board)
+                if move is None:
+                    failures += 1
+                else:
+                    failures = 0
+                    solution.append(move)
+
+            if solution and (moves is None or len(solution) == moves):
+                solution.reverse()
+                return board.game_state(), solution
+
+        raise ValueError(f'Could not play {moves or 1} moves backwards on a '
+            f'{self.ncols}x{self.nrows} board')
+
+def _generate_chunk(args):
+    '''
+    Returns a list of puzzles in the text format for one chunk described by
+    'args', a tuple (ncols, nrows, ncolors, depth, seed, moves, count).
+    '''
+    ncols, nrows, ncolors, depth, seed, moves, count = args
+    generator = Generator(ncols, nrows, ncolors, depth, seed)
+    return [puzzle_io.to_text(generator.generate(moves)[0])
+        for i in range(count)]
+
+def generate_puzzles(ncols, nrows, ncolors, depth, count=None, seed=None,
+    moves=None, jobs=1):
+    '''
+    Arguments:
+        ncols, nrows, ncolors, depth: as in Generator
+        count: number of puzzles, unlimited if None
+        seed: seed of the random number generators
+        moves: as in Generator.generate()
+        jobs: number of worker processes
+
+    Yields solvable puzzles in the text format. Puzzles are made in chunks
+    of CHUNK_SIZE, each with its own generator seeded from 'seed', so the
+    output for a given seed does not depend on 'jobs'.
+    '''
+    def chunks():
+        k = 0
+        remaining = count
+        while remaining is None or remaining > 0:
+            n = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk_seed = None if seed is None else f'{seed}:{k}'
+            yield ncols, nrows, ncolors, depth, chunk_seed, moves, n
+            k += 1
+            if remaining is not None:
+                remaining -= n
+
+    # A chunk is made by one process, so more would sit idle
+    if count is not None:
+        jobs = max(1, min(jobs, -(-count // CHUNK_SIZE)))
+
+    if jobs == 1:
+        for args in chunks():
+            yield from _generate_chunk(args)
+        return
+
+    it = chunks()
+    with multiprocessing.Pool(jobs) as pool:
+        # Only keep a few chunks in flight, as 'count' may be unlimited
+        pending = deque(pool.apply_async(_generate_chunk, (args,))
+            for args in itertools.islice(it, 2 * jobs))
+        while pending:
+            chunk = pending.popleft().get()
+            args = next(it, None)
+            if args is not None:
+                pending.append(pool.apply_async(_generate_chunk, (args,)))
+            yield from chunk
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('ncols', type=int)
+    parser.add_argument('nrows', type=int)
+    parser.add_argument('--colors', type=int, default=4,
+        help='number of colors (default: 4)')
+    parser.add_argument('--depth', type=int, default=2,
+        help='maximum colors stacked in one square (default: 2)')
+    parser.add_argument('--moves', type=int,
+        help='moves needed to solve each puzzle (default: fill the board)')
+    parser.add_argument('--count', type=int, default=1,
+        help='number of puzzles, 0 for no limit (default: 1)')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+        help='number of worker processes (default: number of cores)')
+    args = parser.parse_args(argv)
+
+    try:
+        for text in generate_puzzles(args.ncols, args.nrows, args.colors,
+            args.depth, args.count or None, args.seed, args.moves, args.jobs):
+            sys.stdout.write(text + '\n')
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
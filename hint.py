@@ -0,0 +1,117 @@
+'''
+Computes hints in a background process, so the GUI stays responsive while
+searching.
+'''
+
+import multiprocessing, sqlite3, time
+
+import endgame
+import solver
+from solution_cache import SolutionCache
+
+def _worker(game_state, budget, cache_path, endgame_path, conn):
+    '''
+    Runs in the background process. Sends the result of the search through
+    'conn', see HintEngine.poll().
+    '''
+    deadline = time.monotonic() + budget
+    try:
+        cache = SolutionCache(cache_path) if cache_path else None
+    except sqlite3.Error:
+        cache = None
+    table = endgame.open_table(endgame_path) if endgame_path else None
+
+    try:
+        solution = solver.solve(game_state, deadline, cache, endgame=table)
+    except TimeoutError:
+        conn.send(('timeout', None))
+    else:
+        if solution is None:
+            conn.send(('unsolvable', None))
+        else:
+            conn.send(('move', solution[0]))
+    finally:
+        if cache is not None:
+            cache.close()
+        if table is not None:
+            table.close()
+    conn.close()
+
+class HintEngine:
+    '''
+    Searches for the next move of a game state in a separate process, with
+    a time budget. At most one search runs at a time.
+    '''
+    def __init__(self):
+        self.process = None
+        self.conn = None
+
+    def start(self, game_state, budget, cache_path=None, endgame_path=None):
+        '''
+        Arguments:
+            game_state: a GameState, not altered
+            budget: seconds the search may take
+            cache_path: path of a SolutionCache database to consult first
+            and to store solutions in, or None
+            endgame_path: path of an endgame table answering for small
+            states, or None
+
+        Starts searching for a move that leads to a cleared board, cancelling
+        any search in progress. Poll for the result with poll().
+        '''
+        self.cancel()
+
+        self.conn, child_conn = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=_worker,
+            args=(game_state, budget, cache_path, endgame_path, child_conn),
+            daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def poll(self):
+        '''
+        Returns None while a search is in progress or if there is none.
+        Otherwise returns the result of the finished search, one of:
+            ('move', (loc1, loc2)): the move to make
+            ('unsolvable', None): the board cannot be cleared
+            ('timeout', None): the time budget ran out
+            ('failed', None): the search process died
+        '''
+        if self.process is None:
+            return None
+
+        try:
+            if self.conn.poll():
+                result = self.conn.recv()
+            elif self.process.is_alive():
+                return None
+            elif self.conn.poll():
+                # Finished between the two checks
+                result = self.conn.recv()
+            else:
+                result = ('failed', None)
+        except (EOFError, OSError):
+            result = ('failed', None)
+
+        self._reset()
+        return result
+
+    def running(self):
+        '''
+        Returns whether a search is in progress.
+        '''
+        return self.process is not None
+
+    def cancel(self):
+        '''
+        Stops the search in progress, if there is one.
+        '''
+        if self.process is not None:
+            self.process.terminate()
+            self._reset()
+
+    def _reset(self):
+        self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
@@ -0,0 +1,254 @@
+'''
+Opt-in instrumentation of GameState and Animator.
+
+Nothing is measured until enable() is called, which replaces the measured
+methods with timing wrappers; disable() puts the original methods back, so
+there is no overhead at all while instrumentation is off.
+
+Measured:
+    - count and time of GameState.swap, strip, any_to_remove,
+    remove_connected_groups, is_move_valid, make_move, apply_move and
+    revert
+    - count, time and size (squares and layers) of deep copies of
+    GameState, as pushed on the undo stack
+    - duration of every canvas animation frame, as a histogram, and the
+    number of frames that started late
+    - one-off durations reported with record_time(), such as the time the
+    GUI takes to start up
+
+The results can be read with snapshot() or written as JSON with dump().
+'''
+
+import json, time
+from collections import defaultdict
+
+import GameState as gs
+from animator import Animator
+from constants import FRAME_DELAY
+
+# GameState methods that are counted and timed
+GAME_STATE_METHODS = ['swap', 'strip', 'any_to_remove',
+    'remove_connected_groups', 'is_move_valid', 'make_move', 'apply_move',
+    'revert']
+
+# Animator methods that each draw one frame of a canvas animation
+FRAME_METHODS = ['animate_swap', 'animate_removal', 'animate_victory']
+
+# A frame is late if it starts this many times FRAME_DELAY after the
+# previous frame of the same animation
+LATE_FACTOR = 1.5
+
+# Upper bounds (in milliseconds) of the frame duration histogram buckets
+FRAME_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+
+# Upper bounds (in layers) of the deep copy size histogram buckets
+COPY_BUCKETS = [16, 64, 256, 1024, 4096]
+
+_originals = {}
+
+def _new_call_stats():
+    return {'count': 0, 'total': 0.0, 'max': 0.0}
+
+def _new_histogram(buckets):
+    histogram = {f'<={bound}': 0 for bound in buckets}
+    histogram['more'] = 0
+    return histogram
+
+def _new_frame_stats():
+    return {'count': 0, 'late': 0, 'total': 0.0, 'max': 0.0,
+        'histogram': _new_histogram(FRAME_BUCKETS)}
+
+def _new_copy_stats():
+    return {'count': 0, 'total': 0.0, 'squares': 0, 'layers': 0,
+        'max_layers': 0, 'histogram': _new_histogram(COPY_BUCKETS)}
+
+_calls = defaultdict(_new_call_stats)
+_frames = defaultdict(_new_frame_stats)
+_copies = _new_copy_stats()
+_times = {}
+
+# Start time of the previous frame of each animation
+_last_frame = {}
+
+def record_time(name, seconds):
+    '''
+    Records that the one-off event 'name' took 'seconds'.
+    '''
+    _times[name] = seconds
+
+def _bucket(histogram, buckets, value):
+    for bound in buckets:
+        if value <= bound:
+            histogram[f'<={bound}'] += 1
+            return
+    histogram['more'] += 1
+
+def _record_call(name, seconds):
+    stats = _calls[name]
+    stats['count'] += 1
+    stats['total'] += seconds
+    stats['max'] = max(stats['max'], seconds)
+
+def _record_frame(name, start, seconds, first):
+    stats = _frames[name]
+    stats['count'] += 1
+    stats['total'] += seconds
+    stats['max'] = max(stats['max'], seconds)
+    _bucket(stats['histogram'], FRAME_BUCKETS, seconds * 1000)
+
+    previous = _last_frame.get(name)
+    if not first and previous is not None and \
+    (start - previous) * 1000 > FRAME_DELAY * LATE_FACTOR:
+        stats['late'] += 1
+    _last_frame[name] = start
+
+def _record_copy(game_state, seconds):
+    squares = 0
+    layers = 0
+    for color_queue in game_state.loc_to_color.values():
+        if color_queue:
+            squares += 1
+            layers += len(color_queue)
+
+    _copies['count'] += 1
+    _copies['total'] += seconds
+    _copies['squares'] += squares
+    _copies['layers'] += layers
+    _copies['max_layers'] = max(_copies['max_layers'], layers)
+    _bucket(_copies['histogram'], COPY_BUCKETS, layers)
+
+def wrap(cls, name, metric=None):
+    '''
+    Arguments:
+        cls: a class
+        name: name of a method of 'cls'
+        metric: name to record the calls under, defaults to
+        'ClassName.method'
+
+    Counts and times calls to the method until disable() is called. Can be
+    used to measure methods beyond the default ones, e.g.
+    Application.draw_game_state.
+    '''
+    if (cls, name) in _originals:
+        return
+
+    original = cls.__dict__[name]
+    metric = metric or f'{cls.__name__}.{name}'
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            _record_call(metric, time.perf_counter() - start)
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = original.__doc__
+    _originals[(cls, name)] = original
+    setattr(cls, name, wrapper)
+
+def _wrap_frame(name):
+    original = Animator.__dict__[name]
+
+    def wrapper(self, *args, **kwargs):
+        # animating is only set while an animation is already running
+        first = not self.animating
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            _record_frame(name, start, time.perf_counter() - start, first)
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = original.__doc__
+    _originals[(Animator, name)] = original
+    setattr(Animator, name, wrapper)
+
+def _deepcopy_game_state(self, memo):
+    start = time.perf_counter()
+
+    # What deepcopy() does without instrumentation, see GameState.__reduce__
+    func, args = self.__reduce__()
+    copy = func(*args)
+    memo[id(self)] = copy
+
+    _record_copy(self, time.perf_counter() - start)
+    return copy
+
+def enable():
+    '''
+    Starts measuring. Does nothing if already enabled.
+    '''
+    if _originals:
+        return
+
+    for name in GAME_STATE_METHODS:
+        wrap(gs.GameState, name)
+
+    for name in FRAME_METHODS:
+        _wrap_frame(name)
+
+    _originals[(gs.GameState, '__deepcopy__')] = None
+    gs.GameState.__deepcopy__ = _deepcopy_game_state
+
+def disable():
+    '''
+    Stops measuring and restores the original methods. Collected metrics
+    are kept until reset() is called.
+    '''
+    for (cls, name), original in _originals.items():
+        if original is None:
+            delattr(cls, name)
+        else:
+            setattr(cls, name, original)
+    _originals.clear()
+    _last_frame.clear()
+
+def enabled():
+    '''
+    Returns whether instrumentation is enabled.
+    '''
+    return bool(_originals)
+
+def reset():
+    '''
+    Discards all collected metrics.
+    '''
+    _calls.clear()
+    _frames.clear()
+    _copies.update(_new_copy_stats())
+    _times.clear()
+    _last_frame.clear()
+
+def snapshot():
+    '''
+    Returns a JSON-serializable dict of the metrics collected so far, with
+    times in seconds:
+        'calls': maps 'Class.method' to its count, total and max time
+        'deepcopy': count, total time, total squares and layers copied,
+        largest copy in layers, and a histogram of copy sizes in layers
+        'frames': maps each animation to its frame count, late frame
+        count, total and max time, and a histogram of frame durations in
+        milliseconds
+        'times': maps each name passed to record_time() to its time
+    '''
+    return {
+        'calls': {name: dict(stats) for name, stats in _calls.items()},
+        'deepcopy': dict(_copies, histogram=dict(_copies['histogram'])),
+        'frames': {name: dict(stats, histogram=dict(stats['histogram']))
+            for name, stats in _frames.items()},
+        'times': dict(_times),
+    }
+
+def dump(file):
+    '''
+    Arguments:
+        file: a path or a writable text file
+
+    Writes snapshot() to 'file' as JSON.
+    '''
+    if isinstance(file, str):
+        with open(file, 'w') as f:
+            json.dump(snapshot(), f, indent=2)
+    else:
+        json.dump(snapshot(), file, indent=2)
@@ -7,10 +7,53 @@ Functions on locations and sets of locations.
 '''
 
 import string
+from collections import OrderedDict
 from copy import copy
 from functools import reduce
 from utils import *
 
+# Most locations, summed over the location sets whose connected groups
+# large_groups() and has_large_group() remember between them. Sets hold up
+# to MAX_SIZE ** 2 locations each, so the cache is bounded by their total
+# size rather than by their number
+GROUP_CACHE_LOCATIONS = 1 << 18
+
+# Maps (function, frozenset of locations) to the result of the function for
+# the set, least recently used first, and the number of locations held
+_group_cache = OrderedDict()
+_group_cache_locations = 0
+
+def _cached(func, locset):
+    '''
+    Returns func(locset), remembered in the group cache.
+    '''
+    global _group_cache_locations
+
+    key = func, locset
+    result = _group_cache.get(key)
+    if result is not None:
+        _group_cache.move_to_end(key)
+        return result
+
+    result = func(locset)
+    _group_cache[key] = result
+    # Results are no larger than their sets
+    _group_cache_locations += len(locset)
+    while _group_cache_locations > GROUP_CACHE_LOCATIONS:
+        (old_func, old_locset), old_result = _group_cache.popitem(last=False)
+        _group_cache_locations -= len(old_locset)
+    return result
+
+def clear_group_cache():
+    '''
+    Forgets the connected groups remembered by large_groups() and
+    has_large_group(), e.g. once done with a puzzle.
+    '''
+    global _group_cache_locations
+
+    _group_cache.clear()
+    _group_cache_locations = 0
+
 def orientation(loc1, loc2):
     '''
     Arguments:
@@ -118,14 +161,78 @@ def collect_connected(loc, locset):
     assert is_loc(loc)
     assert is_locset(locset)
 
-    s = {loc}
-    adj = collect_adjacent(locset, s)
+    return _flood_fill(loc, locset)
 
-    for l in adj:
-        if l not in s:
-            s = s.union(collect_connected(l, locset - s))
+def _flood_fill(loc, locset, limit=None):
+    '''
+    Does the work of collect_connected() without validating the arguments,
+    visiting each connected location once. If `limit` is given, stops as
+    soon as that many locations are found.
+    '''
 
-    return s
+    connected = {loc}
+    stack = [loc]
+
+    while stack:
+        x, y = stack.pop()
+        for l in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if l in locset and l not in connected:
+                connected.add(l)
+                if len(connected) == limit:
+                    return connected
+                stack.append(l)
+
+    return connected
+
+def iter_connected(locset):
+    '''
+    Arguments:
+      locset -- a set of (row, column) locations
+
+    Return value:
+      A generator of the subsets of partition_connected(locset), each found
+      only when it is asked for.
+
+    The set `locset` is not altered.
+    '''
+
+    remaining = set(locset)
+
+    while remaining:
+        connected = _flood_fill(remaining.pop(), locset)
+        remaining -= connected
+        yield connected
+
+def has_large_group(locset):
+    '''
+    Arguments:
+      locset -- a set of (row, column) locations
+
+    Return value:
+      True if some connected group of `locset` covers at least 3
+      locations, otherwise False.
+
+    Stops at the first such group, without finding the rest of it, and
+    remembers the answer like large_groups() does.
+
+    The set `locset` is not altered.
+    '''
+
+    if len(locset) < 3:
+        return False
+
+    return _cached(_has_large_group, frozenset(locset))
+
+def _has_large_group(locset):
+    remaining = set(locset)
+
+    while remaining:
+        connected = _flood_fill(remaining.pop(), locset, 3)
+        if len(connected) >= 3:
+            return True
+        remaining -= connected
+
+    return False
 
 def partition_connected(locset):
     '''
@@ -150,7 +257,7 @@ def partition_connected(locset):
 
     while locset2:
         loc = locset2.pop()
-        connected = collect_connected(loc, locset)
+        connected = _flood_fill(loc, locset)
         partition.append(connected)
         locset2 -= connected
 
@@ -187,3 +294,31 @@ def filter_locset(locset):
     return smaller, larger
 
 
+
+def large_groups(locset):
+    '''
+    Arguments:
+      locset -- a set of (row, column) locations
+
+    Return value:
+      A frozenset of the locations in `locset` that are in a connected
+      group of at least 3, like the second set of filter_locset().
+
+    Results are remembered by the location set, with least recently used
+    ones forgotten first. Colors that a move leaves untouched, and the
+    many similar states visited in a search, are then answered without
+    partitioning again.
+
+    The set `locset` is not altered.
+    '''
+
+    return _cached(_large_groups, frozenset(locset))
+
+def _large_groups(locset):
+    larger = set()
+
+    for connected in iter_connected(locset):
+        if len(connected) >= 3:
+            larger |= connected
+
+    return frozenset(larger)
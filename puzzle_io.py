@@ -0,0 +1,171 @@
+'''
+Reading and writing dissembler puzzles in their one-line text format.
+
+See readme.txt for a description of the format. The parser does not depend
+on tkinter, so puzzles can be loaded outside of the GUI. Neither do the
+listings of the bundled puzzles and of corpus files, one puzzle per line,
+shared by the command line tools and the puzzle browser.
+'''
+
+import glob, os, string
+
+from constants import MAX_SIZE
+from utils import puzzles
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'examples')
+
+def parse(line, game_state, color_for=None):
+    '''
+    Arguments:
+        line: a string holding one puzzle in the text format
+        game_state: a GameState object to add the squares to
+        color_for: a function mapping a puzzle character to the color string
+        stored in 'game_state'. It is called once per distinct character.
+        Defaults to using the character itself as the color.
+
+    Parses 'line' into 'game_state' and returns the updated game state.
+    Raises IOError if 'line' is not a valid puzzle.
+    '''
+    color_dict = {}
+
+    for r, row in enumerate(line.rstrip('\n').split(' ')):
+        if r > MAX_SIZE:
+            raise IOError('The size of the puzzle is limited to '+
+                f'{MAX_SIZE}.')
+
+        squares = []
+        it = iter(row)
+
+        for elem in it:
+            if elem == '|':
+                square = ''
+                elem = next(it)
+                try:
+                    while elem != '|':
+                        if elem == '.':
+                            raise IOError('"." cannot be used inside' +
+                                ' a pair of "|". See readme.txt ' +
+                                'for more info on proper input.')
+                        square += elem
+                        elem = next(it)
+                except StopIteration as e:
+                    raise IOError('"|" symbols must be in pairs. ' +
+                        'See readme.txt for more info on ' +
+                        'proper input.') from e
+
+                squares.append(square)
+            else:
+                squares.append(elem)
+
+        for c, square in enumerate(squares):
+            if c > MAX_SIZE:
+                raise IOError('The size of the puzzle is limited to ' +
+                    f'{MAX_SIZE}.')
+            for i in square:
+                if i == '.':
+                    break
+                if i not in color_dict:
+                    color_dict[i] = color_for(i) if color_for else i
+                game_state.add((c, r), color_dict[i])
+
+    return game_state
+
+def load(filename, game_state, color_for=None):
+    '''
+    Arguments:
+        filename: path of a file holding one puzzle on a single line
+        game_state, color_for: as in parse()
+
+    Loads the puzzle in 'filename' into 'game_state' and returns the updated
+    game state.
+    '''
+    with open(filename, 'r') as file:
+        line = file.readline()
+
+        if file.readline():
+            raise IOError('The contents of the file need to be on one ' +
+                'line. See readme.txt for more info on proper input.')
+
+    return parse(line, game_state, color_for)
+
+def bundled_puzzles():
+    '''
+    Returns a list of (name, text) for utils.puzzles and examples/.
+    '''
+    named = [(f'utils.puzzles[{i}]', text) for i, text in enumerate(puzzles)]
+
+    for filename in sorted(glob.glob(os.path.join(EXAMPLES_DIR, '*.txt'))):
+        with open(filename) as file:
+            named.append((f'examples/{os.path.basename(filename)}',
+                file.readline().rstrip('\n')))
+
+    return named
+
+def read_corpus(filenames):
+    '''
+    Returns a list of (name, text) for every non-blank line in the files.
+    '''
+    named = []
+    for filename in filenames:
+        with open(filename) as file:
+            for i, line in enumerate(file):
+                line = line.rstrip('\n')
+                if line.strip():
+                    named.append((f'{filename}:{i + 1}', line))
+    return named
+
+def to_text(game_state):
+    '''
+    Arguments:
+        game_state: a GameState object
+
+    Returns 'game_state' in the one-line text format read by parse(). Colors
+    that are not already usable puzzle characters are replaced by letters in
+    order of first appearance. Raises ValueError if 'game_state' has more
+    colors than there are characters.
+    '''
+    locs = [loc for loc in game_state if game_state.loc_to_color[loc]]
+    if not locs:
+        return ''
+
+    ncols = max(loc[0] for loc in locs) + 1
+    nrows = max(loc[1] for loc in locs) + 1
+
+    char_dict = {}
+    used_chars = set()
+    spare_chars = iter(_CHARS)
+
+    def char_for(color):
+        if color not in char_dict:
+            if len(color) == 1 and color in _CHARS and color not in used_chars:
+                char = color
+            else:
+                try:
+                    char = next(spare_chars)
+                    while char in used_chars:
+                        char = next(spare_chars)
+                except StopIteration:
+                    raise ValueError('A puzzle can use at most ' +
+                        f'{len(_CHARS)} colors') from None
+            char_dict[color] = char
+            used_chars.add(char)
+        return char_dict[color]
+
+    rows = []
+    for r in range(nrows):
+        row = ''
+        for c in range(ncols):
+            color_queue = game_state.loc_to_color.get((c, r))
+            if not color_queue:
+                row += '.'
+            elif len(color_queue) == 1:
+                row += char_for(color_queue[0])
+            else:
+                row += '|' + ''.join(map(char_for, color_queue)) + '|'
+        rows.append(row)
+
+    return ' '.join(rows)
+
+# Characters that can stand for a color in the text format
+_CHARS = string.ascii_lowercase + string.ascii_uppercase + string.digits
@@ -0,0 +1,194 @@
+'''
+Headless replay and verification of recorded games.
+
+A game is logged as one line holding the puzzle in its text format, a tab,
+and the moves made, separated by spaces. A move is written as the location
+of one square, 'x,y', followed by the direction of the square it was
+swapped with: 'r' (x + 1), 'd' (y + 1), 'l' (x - 1) or 'u' (y - 1). For
+example:
+
+    aab.ba.	2,0d 0,1r
+
+A log is valid if every move is valid when made, as in
+GameState.is_move_valid(), and the last one clears the board.
+
+    python replay.py games.log --jobs 8     verify every log in a file
+'''
+
+import argparse, sys, time
+
+import GameState as gs
+import locset as ls
+import puzzle_io
+
+DIRECTIONS = {'r': (1, 0), 'd': (0, 1), 'l': (-1, 0), 'u': (0, -1)}
+
+# Number of logs sent to a worker process at a time
+CHUNK_SIZE = 512
+
+# Most puzzles kept parsed by verify()
+MAX_PUZZLES = 1024
+
+def format_move(move):
+    '''
+    Returns the compact form of 'move', a pair of adjacent locations.
+    '''
+    (x1, y1), (x2, y2) = move
+    for letter, (dx, dy) in DIRECTIONS.items():
+        if (x1 + dx, y1 + dy) == (x2, y2):
+            return f'{x1},{y1}{letter}'
+    raise ValueError(f'Locations of {move} are not adjacent')
+
+def parse_move(text):
+    '''
+    Returns the pair of locations described by the compact move 'text'.
+    Raises ValueError if it is malformed.
+    '''
+    try:
+        dx, dy = DIRECTIONS[text[-1]]
+        x, y = text[:-1].split(',')
+        x, y = int(x), int(y)
+    except (IndexError, KeyError, ValueError) as e:
+        raise ValueError(f'Malformed move {text!r}') from e
+    return (x, y), (x + dx, y + dy)
+
+def format_log(puzzle, moves):
+    '''
+    Arguments:
+        puzzle: a puzzle in the text format
+        moves: a list of moves made from it
+
+    Returns the log line of the game, without a newline.
+    '''
+    return puzzle + '\t' + ' '.join(format_move(move) for move in moves)
+
+def parse_log(line):
+    '''
+    Returns (puzzle, moves) of the log line 'line'. Raises ValueError if it
+    is malformed.
+    '''
+    puzzle, tab, moves = line.rstrip('\n').partition('\t')
+    if not tab:
+        raise ValueError('Missing tab between puzzle and moves')
+    return puzzle, [parse_move(move) for move in moves.split()]
+
+def groups(game_state):
+    '''
+    Returns the set of locations of 'game_state' in connected color groups
+    of three or more.
+    '''
+    found = set()
+    for color, locset in game_state.color_to_loc.items():
+        found |= ls.large_groups(locset)
+    return found
+
+def replay(game_state, moves, exposed=None):
+    '''
+    Arguments:
+        game_state: a GameState, altered by the moves
+        moves: a list of moves
+        exposed: groups(game_state) if already known
+
+    Makes 'moves' on 'game_state'. Returns the index of the first invalid
+    move, which is left unmade, or None if all of them were valid.
+    '''
+    # Before the first move, any group on the board counts as exposed
+    exposed = groups(game_state) if exposed is None else exposed
+
+    for i, (loc1, loc2) in enumerate(moves):
+        try:
+            exposed = game_state.apply_move(loc1, loc2, exposed).stripped
+        except ValueError:
+            return i
+
+    return None
+
+# Maps puzzles to their parsed GameState and its groups, for the current
+# process, see verify()
+_parsed = {}
+
+def verify(line):
+    '''
+    Returns None if the log line 'line' records a won game, otherwise a
+    string describing why not.
+    '''
+    try:
+        puzzle, moves = parse_log(line)
+    except ValueError as e:
+        return str(e)
+
+    # Many logs tend to share a puzzle, and copying beats parsing
+    try:
+        initial, exposed = _parsed[puzzle]
+    except KeyError:
+        try:
+            initial = puzzle_io.parse(puzzle, gs.GameState())
+        except (IOError, StopIteration) as e:
+            return f'Malformed puzzle: {e}'
+        exposed = groups(initial)
+        if len(_parsed) >= MAX_PUZZLES:
+            _parsed.clear()
+        _parsed[puzzle] = initial, exposed
+
+    game_state = initial.copy()
+    i = replay(game_state, moves, exposed)
+    if i is not None:
+        try:
+            move = format_move(moves[i])
+        except ValueError:
+            move = moves[i]
+        return f'Move {i + 1}, {move}, is invalid'
+    if game_state:
+        return 'The board is not cleared'
+    return None
+
+def verify_logs(lines, jobs=1):
+    '''
+    Arguments:
+        lines: an iterable of log lines
+        jobs: number of worker processes
+
+    Yields the verify() result of every line, in order.
+    '''
+    if jobs == 1:
+        yield from map(verify, lines)
+        return
+
+    # Imported here, as the GUI uses this module for its move format
+    import multiprocessing
+
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(verify, lines, chunksize=CHUNK_SIZE)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='+',
+        help='log files, one game per line')
+    parser.add_argument('--jobs', type=int, default=1,
+        help='number of worker processes (default: 1)')
+    parser.add_argument('--quiet', action='store_true',
+        help='only print the summary')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    total = invalid = 0
+    for filename in args.files:
+        with open(filename) as file:
+            numbered = [(i + 1, line) for i, line in enumerate(file)
+                if line.strip()]
+
+        errors = verify_logs([line for n, line in numbered], args.jobs)
+        for (n, line), error in zip(numbered, errors):
+            total += 1
+            if error is not None:
+                invalid += 1
+                if not args.quiet:
+                    print(f'{filename}:{n}: {error}')
+    elapsed = time.perf_counter() - start
+
+    print(f'{total - invalid} of {total} games valid ' +
+        f'({total / elapsed if elapsed else 0:.0f} per second)')
+    return 1 if invalid else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+'''
+Monte Carlo estimates of how likely a dissembler position is to be cleared.
+
+Plays many quick games from a position within a time budget. Each game
+starts with one of the valid moves of the position in turn and continues
+with random valid moves, until the board is cleared or no move is left. In
+guided games, moves after which GameState.is_dead() proves the board lost
+are avoided when there is another choice.
+
+Reported are the share of games won, overall and per first move, and one
+winning line if any game was won, which proves the position solvable. No
+win only suggests it is stuck: exhaustive search (analyzer.py, solver.py)
+is needed to be sure, but is too slow for large boards.
+
+    python rollout.py                       estimate the bundled puzzles
+    python rollout.py corpus.txt --budget 5 --jobs 4
+'''
+
+import argparse, multiprocessing, random, sys, time
+
+import GameState as gs
+import puzzle_io
+from puzzle_io import bundled_puzzles, read_corpus
+
+DEFAULT_BUDGET = 1.0
+
+# Rollouts played between two checks of the clock
+CHECK_EVERY = 16
+
+def adjacent_pairs(game_state):
+    '''
+    Returns a list of every pair of adjacent non-empty locations of
+    'game_state', each pair once. No other pair can ever be a valid move.
+    '''
+    filled = set(loc for loc, color_queue in game_state.loc_to_color.items()
+        if color_queue)
+    return [(loc, other) for loc in sorted(filled)
+        for other in ((loc[0] + 1, loc[1]), (loc[0], loc[1] + 1))
+        if other in filled]
+
+def _kills(game_state, stripped):
+    '''
+    Returns whether stripping 'stripped', a dict mapping locations to the
+    colors stripped from them, made GameState.is_dead() true, given that it
+    was false before. Only the colors stripped can have changed.
+    '''
+    color_layers, color_depths = game_state.color_layers, \
+        game_state.color_depths
+    for color in set(stripped.values()):
+        layers = color_layers[color]
+        if layers and 3 * max(color_depths[color]) > layers:
+            return True
+    return False
+
+def play(game_state, pairs, rng, guided=True, first=None):
+    '''
+    Arguments:
+        game_state: a GameState, altered by the game
+        pairs: adjacent_pairs() of 'game_state'
+        rng: a random.Random
+        guided: whether to avoid moves into provably lost states
+        first: the first move to make, or None for a random one
+
+    Plays random valid moves until the board is cleared or stuck. Returns
+    the list of moves made.
+    '''
+    moves = []
+    loc_to_color = game_state.loc_to_color
+    # Locations stripped by the last move, see GameState.apply_move()
+    exposed = None
+
+    if first is not None:
+        exposed = game_state.apply_move(*first).stripped
+        moves.append(first)
+
+    # A location that was emptied stays empty, so its pairs are dropped
+    order = [(loc1, loc2) for loc1, loc2 in pairs
+        if loc_to_color.get(loc1) and loc_to_color.get(loc2)]
+    # Whether the moves so far may have lost the game already, in which
+    # case there is nothing left to avoid
+    dead = guided and game_state.is_dead()
+
+    while game_state:
+        # The moves are tried in a random order drawn one at a time, so
+        # that the first valid one is a uniform choice
+        fallback = None
+        untried = len(order)
+        while untried:
+            i = rng.randrange(untried)
+            untried -= 1
+            move = order[i]
+            order[i], order[untried] = order[untried], move
+            try:
+                diff = game_state.apply_move(*move, exposed)
+            except ValueError:
+                continue
+            if guided and not dead and _kills(game_state, diff.stripped):
+                if fallback is None:
+                    fallback = move
+                game_state.revert(diff)
+                continue
+            break
+        else:
+            if fallback is None:
+                break
+            move = fallback
+            diff = game_state.apply_move(*move, exposed)
+            dead = True
+        exposed = diff.stripped
+        moves.append(move)
+
+        if None in diff.tops.values():
+            order = [(loc1, loc2) for loc1, loc2 in order
+                if loc_to_color.get(loc1) and loc_to_color.get(loc2)]
+
+    return moves
+
+def _run(args):
+    '''
+    Plays rollouts of one process for 'budget' seconds. Returns a dict of
+    the counts, see estimate().
+    '''
+    game_state, budget, seed, guided = args
+    deadline = time.monotonic() + budget
+    rng = random.Random(seed)
+
+    pairs = adjacent_pairs(game_state)
+    first_moves = list(game_state.legal_moves())
+    plays = {move: 0 for move in first_moves}
+    wins = {move: 0 for move in first_moves}
+    solution = None
+
+    i = rng.randrange(len(first_moves)) if first_moves else 0
+    while first_moves:
+        for _ in range(CHECK_EVERY):
+            first = first_moves[i % len(first_moves)]
+            i += 1
+
+            state = game_state.copy()
+            moves = play(state, pairs, rng, guided, first)
+            plays[first] += 1
+            if not state:
+                wins[first] += 1
+                if solution is None or len(moves) < len(solution):
+                    solution = moves
+        if time.monotonic() > deadline:
+            break
+
+    return {'plays': plays, 'wins': wins, 'solution': solution}
+
+def estimate(game_state, budget=DEFAULT_BUDGET, jobs=1, seed=None,
+guided=True):
+    '''
+    Arguments:
+        game_state: a GameState, not altered
+        budget: seconds to play for
+        jobs: number of worker processes
+        seed: seed of the random choices, for repeatable results
+        guided: whether to avoid moves into provably lost states
+
+    Returns a dict of:
+        rollouts, wins: number of games played and won
+        clear_rate: wins / rollouts, 0 if there were none
+        solution: the shortest winning list of moves played, or None
+        moves: a list of (move, rollouts, wins, clear_rate) for each valid
+        move of 'game_state', best first
+    '''
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    tasks = [(game_state, budget, f'{seed}:{k}', guided)
+        for k in range(jobs)]
+
+    if not game_state:
+        results = []
+    elif jobs == 1:
+        results = [_run(tasks[0])]
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.map(_run, tasks)
+
+    plays, wins = {}, {}
+    solution = None
+    for result in results:
+        for move, count in result['plays'].items():
+            plays[move] = plays.get(move, 0) + count
+            wins[move] = wins.get(move, 0) + result['wins'][move]
+        if result['solution'] is not None and (solution is None or
+        len(result['solution']) < len(solution)):
+            solution = result['solution']
+
+    rollouts, won = sum(plays.values()), sum(wins.values())
+    moves = [(move, plays[move], wins[move],
+        wins[move] / plays[move] if plays[move] else 0) for move in plays]
+    moves.sort(key=lambda row: row[3], reverse=True)
+
+    return {'rollouts': rollouts, 'wins': won,
+        'clear_rate': won / rollouts if rollouts else 0,
+        'solution': [] if not game_state else solution, 'moves': moves}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='*',
+        help='puzzle files, one puzzle per line (default: bundled puzzles)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+        help=f'seconds per puzzle (default: {DEFAULT_BUDGET})')
+    parser.add_argument('--jobs', type=int, default=1,
+        help='number of worker processes (default: 1)')
+    parser.add_argument('--seed', type=int,
+        help='seed of the random choices')
+    parser.add_argument('--unguided', action='store_true',
+        help='play uniformly random valid moves')
+    args = parser.parse_args(argv)
+
+    named = read_corpus(args.files) if args.files else bundled_puzzles()
+    for name, text in named:
+        result = estimate(puzzle_io.parse(text, gs.GameState()),
+            args.budget, args.jobs, args.seed, not args.unguided)
+        best = result['moves'][0] if result['moves'] else None
+        print(f'{name:<24} clear rate {result["clear_rate"]:7.2%}' +
+            f'  rollouts {result["rollouts"]:>7}' +
+            f'  {"solvable" if result["solution"] is not None else "stuck?"}'
+            + (f'  best first move {best[0]} ({best[3]:.1%})' if best
+            else ''))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
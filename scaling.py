@@ -0,0 +1,237 @@
+'''
+Scaling-curve benchmark for the game kernels.
+
+Generates synthetic boards of increasing size and color count, times the
+kernels on each, and fits the empirical growth exponent of time against the
+number of squares. A kernel fails if its exponent exceeds the one expected
+of it by more than a tolerance, e.g. if connected-group detection, which
+should be linear, turns quadratic:
+
+    python scaling.py
+    python scaling.py --sizes 10 20 50 100 --colors 3 --json curves.json
+
+The exit status is 1 if any kernel fails.
+'''
+
+import argparse, json, math, random, sys, time
+from copy import deepcopy
+
+import locset as ls
+from benchmark import synthetic_board, adjacent_pairs
+
+DEFAULT_SIZES = [10, 15, 20, 30, 50, 100, 200, 500]
+DEFAULT_COLORS = [3, 8]
+DEFAULT_TOLERANCE = 0.3
+
+# Kernels never run on boards wider than this, so that the slower ones
+# finish in reasonable time
+MAX_SIZES = {
+    'legal_moves': 30,
+}
+
+# Upper bound of the growth exponent of each kernel in the number of squares
+EXPECTED_EXPONENTS = {
+    'partition_connected': 1,
+    'is_move_valid': 1,
+    'remove_connected_groups': 1,
+    'legal_moves': 2,
+}
+
+def time_call(func, setup, min_time=0.1, min_repeat=3):
+    '''
+    Arguments:
+        func: a function of one argument to time
+        setup: a function returning the argument for 'func', called
+        untimed before each run
+        min_time: keep running until this many seconds have been spent
+        min_repeat: run at least this many times
+
+    Returns the fastest run in seconds.
+    '''
+    best = float('inf')
+    spent = 0
+    runs = 0
+    while runs < min_repeat or spent < min_time:
+        arg = setup()
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        spent += elapsed
+        runs += 1
+    return best
+
+def _central_pair(game_state, valid, kernel):
+    '''
+    Returns the adjacent pair closest to the middle of 'game_state' whose
+    swap is valid (or invalid, if 'valid' is False). Raises ValueError,
+    naming 'kernel', the kernel timed with it, if there is none.
+    '''
+    pairs = adjacent_pairs(game_state)
+    midx = (game_state.minrow + game_state.maxrow) / 2
+    midy = (game_state.mincol + game_state.maxcol) / 2
+    pairs.sort(key=lambda pair:
+        abs(pair[0][0] - midx) + abs(pair[0][1] - midy))
+    for pair in pairs:
+        if game_state.is_move_valid(*pair) == valid:
+            return pair
+    raise ValueError(f'{kernel}: no {"valid" if valid else "invalid"} move ' +
+        f'on the {game_state.nrows()}x{game_state.ncols()} board')
+
+def _time_partition_connected(game_state):
+    locsets = [set(locset) for locset in game_state.color_to_loc.values()]
+    def run(arg):
+        for locset in locsets:
+            ls.partition_connected(locset)
+    return time_call(run, lambda: None)
+
+def _time_is_move_valid(game_state):
+    # An invalid swap never stops the scan early
+    loc1, loc2 = _central_pair(game_state, False, 'is_move_valid')
+    return time_call(lambda arg: game_state.is_move_valid(loc1, loc2),
+        lambda: None)
+
+def _time_remove_connected_groups(game_state):
+    loc1, loc2 = _central_pair(game_state, True, 'remove_connected_groups')
+    def setup():
+        copy = deepcopy(game_state)
+        copy.swap(loc1, loc2)
+        return copy
+    return time_call(lambda copy: copy.remove_connected_groups(), setup,
+        min_time=0)
+
+def _time_legal_moves(game_state):
+    pairs = adjacent_pairs(game_state)
+    def run(arg):
+        return [pair for pair in pairs if game_state.is_move_valid(*pair)]
+    return time_call(run, lambda: None, min_time=0, min_repeat=1)
+
+KERNELS = {
+    'partition_connected': _time_partition_connected,
+    'is_move_valid': _time_is_move_valid,
+    'remove_connected_groups': _time_remove_connected_groups,
+    'legal_moves': _time_legal_moves,
+}
+
+def fit_exponent(points):
+    '''
+    Arguments:
+        points: a list of (n, seconds) pairs
+
+    Returns the slope of the least-squares line through the points on a
+    log-log scale, i.e. k such that seconds grows like n ** k.
+    '''
+    xs = [math.log(n) for n, t in points]
+    ys = [math.log(t) for n, t in points]
+    meanx = sum(xs) / len(xs)
+    meany = sum(ys) / len(ys)
+    num = sum((x - meanx) * (y - meany) for x, y in zip(xs, ys))
+    den = sum((x - meanx) ** 2 for x in xs)
+    return num / den
+
+def measure(sizes=DEFAULT_SIZES, colors=DEFAULT_COLORS, kernels=None,
+    depth=2, seed=0, log=None):
+    '''
+    Arguments:
+        sizes: board widths to measure, boards are square
+        colors: color counts to measure
+        kernels: names of the kernels to time, defaults to all of KERNELS
+        depth: maximum number of colors stacked in one square
+        seed: seed of the random boards
+        log: optional function called with a progress message per timing
+
+    Returns a dict mapping kernel names to dicts mapping each color count
+    to a list of (squares, seconds) points. Kernels that cannot run on a
+    board, such as those timing a valid move on a board without any, are
+    skipped for it and reported through 'log'.
+    '''
+    kernels = kernels or list(KERNELS)
+    curves = {kernel: {ncolors: [] for ncolors in colors}
+        for kernel in kernels}
+
+    for ncolors in colors:
+        for size in sorted(sizes):
+            if all(size > MAX_SIZES.get(kernel, size) for kernel in kernels):
+                continue
+
+            rng = random.Random(seed)
+            game_state = synthetic_board(size, size, ncolors, depth, rng)
+
+            for kernel in kernels:
+                if size > MAX_SIZES.get(kernel, size):
+                    continue
+                try:
+                    seconds = KERNELS[kernel](game_state)
+                except ValueError as e:
+                    if log:
+                        log(f'Skipped {e}')
+                    continue
+                curves[kernel][ncolors].append((size * size, seconds))
+                if log:
+                    log(f'{kernel:<26}{size:>4}x{size:<4} {ncolors:>2} colors' +
+                        f'{seconds * 1000:>12.3f} ms')
+
+    return curves
+
+def check(curves, tolerance=DEFAULT_TOLERANCE):
+    '''
+    Arguments:
+        curves: as returned by measure()
+        tolerance: how far a fitted exponent may exceed the expected one
+
+    Returns two lists of (kernel, ncolors, exponent, expected) tuples: one
+    for every curve with at least two points, and one of the failing ones.
+    '''
+    fits = []
+    failures = []
+
+    for kernel, by_colors in curves.items():
+        for ncolors, points in by_colors.items():
+            if len(points) < 2:
+                continue
+            fit = (kernel, ncolors, fit_exponent(points),
+                EXPECTED_EXPONENTS[kernel])
+            fits.append(fit)
+            if fit[2] > fit[3] + tolerance:
+                failures.append(fit)
+
+    return fits, failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='board widths to measure')
+    parser.add_argument('--colors', type=int, nargs='+',
+        default=DEFAULT_COLORS, help='color counts to measure')
+    parser.add_argument('--kernels', nargs='+', choices=list(KERNELS),
+        help='kernels to time (default: all)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help='allowed excess over the expected exponent ' +
+        f'(default: {DEFAULT_TOLERANCE})')
+    parser.add_argument('--json', metavar='PATH',
+        help='save the measured curves and exponents as JSON')
+    args = parser.parse_args(argv)
+
+    curves = measure(args.sizes, args.colors, args.kernels, log=print)
+    fits, failures = check(curves, args.tolerance)
+
+    for kernel, ncolors, exponent, expected in fits:
+        status = 'FAIL' if exponent > expected + args.tolerance else 'ok'
+        print(f'{kernel:<26}{ncolors:>3} colors  exponent {exponent:5.2f}' +
+            f'  expected <= {expected}  {status}')
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({
+                'curves': {kernel: {str(ncolors): points
+                    for ncolors, points in by_colors.items()}
+                    for kernel, by_colors in curves.items()},
+                'exponents': [{'kernel': kernel, 'colors': ncolors,
+                    'exponent': exponent, 'expected': expected}
+                    for kernel, ncolors, exponent, expected in fits],
+            }, file, indent=2)
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,343 @@
+'''
+A local game server hosting many concurrent dissembler sessions.
+
+Speaks JSON over HTTP/1.1, with keep-alive:
+
+    POST   /sessions                {"puzzle": text} or {"index": n}
+    GET    /sessions/<id>
+    POST   /sessions/<id>/move      {"move": "2,0d"}, see replay.py
+    POST   /sessions/<id>/undo
+    POST   /sessions/<id>/restart
+    DELETE /sessions/<id>
+
+Every response but the last describes the session as
+{"id", "board", "moves", "won"}: the board in the puzzle text format and
+the number of moves made, which undos do not reduce. A move response also
+has "removed", the list of stripped locations. Errors are returned as
+{"error": message} with a 4xx status.
+
+A session only stores the moves made on its puzzle, which is parsed once
+and shared by all the sessions playing it. The game states of recently
+used sessions are kept, and any other is rebuilt by replaying its moves.
+
+    python server.py --port 8000
+'''
+
+import argparse, asyncio, collections, json, re, secrets, sys, time
+
+import GameState as gs
+import puzzle_io
+import replay
+from utils import puzzles
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+
+# Most game states kept in memory
+MAX_LIVE_STATES = 1024
+
+# Seconds after its last request that a session is deleted
+SESSION_TTL = 24 * 60 * 60
+
+# Seconds between checks for expired sessions
+EXPIRE_EVERY = 60
+
+# Largest request body accepted, in bytes
+MAX_BODY = 64 * 1024
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large'}
+
+class RequestError(Exception):
+    '''
+    An error in a request, answered with 'status'.
+    '''
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class Puzzle:
+    '''
+    A parsed puzzle, shared by every session playing it.
+    '''
+    __slots__ = ('text', 'game_state', 'groups', 'moves', 'sessions')
+
+    def __init__(self, text):
+        self.text = text
+        self.game_state = puzzle_io.parse(text, gs.GameState())
+        self.groups = replay.groups(self.game_state)
+        # One shared instance of each move made, so that session histories
+        # only hold references
+        self.moves = {}
+        # Number of sessions playing it
+        self.sessions = 0
+
+class Session:
+    '''
+    The moves made on a puzzle by one player.
+    '''
+    __slots__ = ('id', 'puzzle', 'history', 'moves', 'used')
+
+    def __init__(self, id, puzzle):
+        self.id = id
+        self.puzzle = puzzle
+        # The moves leading to the current state, popped by undos
+        self.history = []
+        # Number of moves made, undos do not reset
+        self.moves = 0
+        self.used = time.monotonic()
+
+class GameServer:
+    '''
+    Holds the sessions and answers requests about them.
+    '''
+    def __init__(self, max_live_states=MAX_LIVE_STATES,
+    session_ttl=SESSION_TTL):
+        self.max_live_states = max_live_states
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        # Maps puzzle texts to Puzzles
+        self.puzzles = {}
+        # Maps session ids to their current GameState, least recently used
+        # first
+        self.live = collections.OrderedDict()
+
+    def create(self, text):
+        '''
+        Returns a new Session playing the puzzle 'text'. Raises RequestError
+        if it is not a valid puzzle.
+        '''
+        puzzle = self.puzzles.get(text)
+        if puzzle is None:
+            try:
+                puzzle = Puzzle(text)
+                # Sessions are described in the text format, which has
+                # room for a limited number of colors
+                puzzle_io.to_text(puzzle.game_state)
+            except (IOError, StopIteration, ValueError) as e:
+                raise RequestError(400, f'Malformed puzzle: {e}') from e
+            self.puzzles[text] = puzzle
+        puzzle.sessions += 1
+
+        session = Session(secrets.token_hex(8), puzzle)
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, id):
+        '''
+        Returns the Session 'id'. Raises RequestError if there is none.
+        '''
+        try:
+            session = self.sessions[id]
+        except KeyError:
+            raise RequestError(404, f'No session {id}') from None
+        session.used = time.monotonic()
+        return session
+
+    def delete(self, session):
+        del self.sessions[session.id]
+        self.live.pop(session.id, None)
+
+        session.puzzle.sessions -= 1
+        if not session.puzzle.sessions:
+            del self.puzzles[session.puzzle.text]
+
+    def expire(self):
+        '''
+        Deletes the sessions unused for longer than session_ttl.
+        '''
+        limit = time.monotonic() - self.session_ttl
+        for session in [session for session in self.sessions.values()
+        if session.used < limit]:
+            self.delete(session)
+
+    def state(self, session):
+        '''
+        Returns the current GameState of 'session'.
+        '''
+        game_state = self.live.get(session.id)
+        if game_state is not None:
+            self.live.move_to_end(session.id)
+            return game_state
+
+        game_state = session.puzzle.game_state.copy()
+        replay.replay(game_state, session.history, session.puzzle.groups)
+
+        self.live[session.id] = game_state
+        if len(self.live) > self.max_live_states:
+            self.live.popitem(last=False)
+        return game_state
+
+    def move(self, session, move):
+        '''
+        Makes 'move' in 'session'. Returns the set of stripped locations.
+        Raises RequestError if the move is not valid.
+        '''
+        try:
+            diff = self.state(session).apply_move(*move)
+        except ValueError:
+            raise RequestError(400, 'Invalid move') from None
+
+        session.history.append(session.puzzle.moves.setdefault(move, move))
+        session.moves += 1
+        return set(diff.stripped)
+
+    def undo(self, session):
+        if session.history:
+            session.history.pop()
+            self.live.pop(session.id, None)
+
+    def restart(self, session):
+        session.history = []
+        session.moves = 0
+        self.live.pop(session.id, None)
+
+    def describe(self, session):
+        game_state = self.state(session)
+        try:
+            board = puzzle_io.to_text(game_state)
+        except ValueError as e:
+            raise RequestError(400, str(e)) from e
+        return {'id': session.id, 'board': board, 'moves': session.moves,
+            'won': not game_state}
+
+    def dispatch(self, method, path, body):
+        '''
+        Arguments:
+            method: the HTTP method
+            path: the request path
+            body: the decoded JSON body, or None
+
+        Returns (status, result) of a request.
+        '''
+        match = re.fullmatch(r'/sessions(?:/([0-9a-f]+)(?:/(\w+))?)?/?', path)
+        if match is None:
+            raise RequestError(404, f'No resource {path}')
+        id, action = match.groups()
+        body = body if isinstance(body, dict) else {}
+
+        if id is None:
+            if method != 'POST':
+                raise RequestError(405, f'{method} not allowed')
+            if 'index' in body:
+                try:
+                    text = puzzles[int(body['index'])]
+                except (IndexError, TypeError, ValueError):
+                    raise RequestError(400, 'No such puzzle') from None
+            elif isinstance(body.get('puzzle'), str):
+                text = body['puzzle']
+            else:
+                raise RequestError(400, 'Missing "puzzle" or "index"')
+            return 201, self.describe(self.create(text))
+
+        session = self.get(id)
+
+        if action is None:
+            if method == 'GET':
+                return 200, self.describe(session)
+            if method == 'DELETE':
+                self.delete(session)
+                return 200, {}
+            raise RequestError(405, f'{method} not allowed')
+
+        if method != 'POST':
+            raise RequestError(405, f'{method} not allowed')
+
+        if action == 'move':
+            try:
+                move = replay.parse_move(str(body.get('move', '')))
+            except ValueError as e:
+                raise RequestError(400, str(e)) from e
+            removed = self.move(session, move)
+            return 200, dict(self.describe(session),
+                removed=sorted(removed))
+        if action == 'undo':
+            self.undo(session)
+        elif action == 'restart':
+            self.restart(session)
+        else:
+            raise RequestError(404, f'No action {action}')
+        return 200, self.describe(session)
+
+    async def handle(self, reader, writer):
+        '''
+        Answers the requests of one connection.
+        '''
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, version = line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, colon, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                try:
+                    if length > MAX_BODY:
+                        raise RequestError(413, 'Request too large')
+                    body = await reader.readexactly(length) if length \
+                        else b''
+                    try:
+                        body = json.loads(body) if body else None
+                    except ValueError as e:
+                        raise RequestError(400, 'Malformed JSON') from e
+                    status, result = self.dispatch(method, path, body)
+                except RequestError as e:
+                    status, result = e.status, {'error': str(e)}
+
+                payload = json.dumps(result).encode()
+                writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                    'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(payload)}\r\n\r\n'.encode() +
+                    payload)
+                await writer.drain()
+
+                if status == 413 or version == 'HTTP/1.0' or \
+                headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Broken or malformed connection
+            pass
+        finally:
+            writer.close()
+
+    async def expire_forever(self):
+        while True:
+            await asyncio.sleep(EXPIRE_EVERY)
+            self.expire()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        '''
+        Serves requests on 'host' and 'port' until cancelled.
+        '''
+        server = await asyncio.start_server(self.handle, host, port)
+        expiry = asyncio.create_task(self.expire_forever())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            expiry.cancel()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=DEFAULT_HOST,
+        help=f'address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+        help=f'port to listen on (default: {DEFAULT_PORT})')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(GameServer().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
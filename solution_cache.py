@@ -0,0 +1,134 @@
+'''
+A persistent cache of puzzle solutions, stored in a SQLite database.
+
+Game states are keyed by their canonical form (see canonical.py), so the
+same position is found again even though the GUI picks new random colors
+every time a puzzle is loaded, and mirrored or rotated positions share one
+entry. Solutions are stored in canonical locations and mapped back to those
+of the board on lookup. The number of cached states is bounded by evicting
+the least recently used ones.
+'''
+
+import json, sqlite3, time
+
+from canonical import canonical_form
+from constants import SOLUTION_CACHE
+
+DEFAULT_PATH = SOLUTION_CACHE
+
+DEFAULT_MAX_ENTRIES = 100000
+
+# Number of lookups whose access times are kept in memory before being
+# written to the database
+TOUCH_BATCH = 256
+
+# Number of insertions between checks of the size of the cache
+EVICT_EVERY = 64
+
+class SolutionCache:
+    '''
+    Maps game states to the shortest known list of moves that clears them,
+    or to None if they are known to be unsolvable.
+    '''
+    def __init__(self, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        '''
+        Arguments:
+            path: file of the database, created if missing
+            max_entries: most states to keep
+        '''
+        self.path = path
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, timeout=10)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS solutions (
+            key TEXT PRIMARY KEY,
+            solution TEXT,
+            length INTEGER,
+            used INTEGER NOT NULL)''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS solutions_used
+            ON solutions (used)''')
+        self.conn.commit()
+
+        # Maps keys to access times not yet written to the database
+        self.touched = {}
+        self.puts = 0
+
+    def get(self, game_state):
+        '''
+        Returns the cached solution of 'game_state' as a list of moves, or
+        None if it is known to be unsolvable. Raises KeyError if it is not
+        cached.
+        '''
+        key, transform = canonical_form(game_state)
+        row = self.conn.execute('SELECT solution FROM solutions WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            raise KeyError(f'{key} not found')
+
+        self.touched[key] = time.time_ns()
+        if len(self.touched) >= TOUCH_BATCH:
+            self.flush()
+
+        if row[0] is None:
+            return None
+        return transform.invert_moves([tuple(map(tuple, move))
+            for move in json.loads(row[0])])
+
+    def put(self, game_state, solution):
+        '''
+        Arguments:
+            game_state: a GameState
+            solution: a list of moves that clears 'game_state', or None if
+            it cannot be cleared
+
+        Caches 'solution' unless a shorter one is already cached.
+        '''
+        key, transform = canonical_form(game_state)
+        length = None if solution is None else len(solution)
+        encoded = None if solution is None else \
+            json.dumps(transform.apply_moves(solution))
+
+        cursor = self.conn.execute('''INSERT INTO solutions VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                solution = excluded.solution,
+                length = excluded.length,
+                used = excluded.used
+            WHERE solutions.length > excluded.length''',
+            (key, encoded, length, time.time_ns()))
+        # A pending access time is only outdated if the row was written
+        if cursor.rowcount:
+            self.touched.pop(key, None)
+
+        self.puts += 1
+        if self.puts % EVICT_EVERY == 0:
+            self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        '''
+        Deletes the least recently used states beyond max_entries.
+        '''
+        count = self.conn.execute('SELECT COUNT(*) FROM solutions').fetchone()
+        if count[0] > self.max_entries:
+            self.flush()
+            self.conn.execute('''DELETE FROM solutions WHERE key IN
+                (SELECT key FROM solutions ORDER BY used LIMIT ?)''',
+                (count[0] - self.max_entries,))
+
+    def flush(self):
+        '''
+        Writes the access times of recent lookups to the database.
+        '''
+        if self.touched:
+            self.conn.executemany('UPDATE solutions SET used = ? WHERE key = ?',
+                [(used, key) for key, used in self.touched.items()])
+            self.conn.commit()
+            self.touched.clear()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
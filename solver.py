@@ -0,0 +1,158 @@
+'''
+Search for solutions of dissembler puzzles.
+'''
+
+import multiprocessing, random, time
+
+import locset as ls
+import transposition as tt
+
+def solve(game_state, deadline=None, cache=None, table=None, rng=None,
+endgame=None):
+    '''
+    Arguments:
+        game_state: a GameState, not altered
+        deadline: a time.monotonic() value after which to give up, or None
+        to search until done
+        cache: a SolutionCache to consult before searching and to store the
+        result in, or None
+        table: a TranspositionTable shared with other searches of the same
+        puzzle, or None
+        rng: a random.Random to try the moves of each state in random
+        order, or None to try them in order
+        endgame: an endgame.Tablebase answering for the states small enough
+        to be in it, or None
+
+    Returns a list of moves that clears the board of 'game_state', or None
+    if it cannot be cleared. The solution is not necessarily the shortest.
+    Raises TimeoutError if 'deadline' passes first.
+    '''
+    if cache is not None:
+        try:
+            return cache.get(game_state)
+        except KeyError:
+            pass
+
+    # The groups remembered for other puzzles are of no use for this one
+    ls.clear_group_cache()
+
+    # Keys of states known not to lead to a cleared board
+    failed = set()
+
+    def search(state):
+        if not state:
+            return []
+        if state.is_dead():
+            return None
+
+        if endgame is not None:
+            entry = endgame.probe(state)
+            if entry is not None:
+                return None if entry[0] is None else endgame.solve(state)
+
+        key = state.key()
+        if key in failed:
+            return None
+
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError('No solution found in time')
+
+        moves = list(state.legal_moves())
+        if rng is not None:
+            rng.shuffle(moves)
+        if table is not None:
+            key_hash = tt.state_hash(state)
+            layers = sum(state.color_layers.values())
+            entry = table.lookup(key_hash)
+            if entry is not None:
+                result, stored_layers, length, move = entry
+                if result == tt.UNSOLVABLE:
+                    failed.add(key)
+                    return None
+                if move in moves:
+                    # Try the known way first
+                    moves.remove(move)
+                    moves.insert(0, move)
+
+        for move in moves:
+            rest = search(state.successor(move))
+            if rest is not None:
+                if table is not None:
+                    table.store(key_hash, tt.SOLVABLE, layers, len(rest) + 1,
+                        move)
+                return [move] + rest
+
+        failed.add(key)
+        if table is not None:
+            table.store(key_hash, tt.UNSOLVABLE, layers)
+        return None
+
+    solution = search(game_state.copy())
+
+    if cache is not None:
+        store(cache, game_state, solution)
+
+    return solution
+
+def store(cache, game_state, solution):
+    '''
+    Arguments:
+        cache: a SolutionCache
+        game_state: a GameState, not altered
+        solution: a list of moves that clears 'game_state', or None if it
+        cannot be cleared
+
+    Caches 'solution' for 'game_state', and the rest of it for every state
+    passed through on the way.
+    '''
+    cache.put(game_state, solution)
+
+    if solution:
+        state = game_state
+        for i, move in enumerate(solution[:-1]):
+            state = state.successor(move)
+            cache.put(state, solution[i + 1:])
+
+def _solve_worker(args):
+    '''
+    Runs solve() in a worker process of solve_parallel(). Returns
+    ('solution', moves) or ('timeout', None).
+    '''
+    game_state, name, budget, seed = args
+    table = tt.TranspositionTable.attach(name)
+    deadline = None if budget is None else time.monotonic() + budget
+    try:
+        return 'solution', solve(game_state, deadline, table=table,
+            rng=random.Random(seed) if seed is not None else None)
+    except TimeoutError:
+        return 'timeout', None
+    finally:
+        table.close()
+
+def solve_parallel(game_state, jobs, budget=None, slots=tt.DEFAULT_SLOTS,
+seed=0):
+    '''
+    Arguments:
+        game_state: a GameState, not altered
+        jobs: number of worker processes
+        budget: seconds the search may take, or None to search until done
+        slots: size of the shared transposition table
+        seed: seed of the move orders of the workers
+
+    Searches with 'jobs' processes trying moves in different orders and
+    sharing a transposition table, so that each skips the states another
+    found unsolvable. Returns like solve(), from whichever process is done
+    first. Raises TimeoutError if 'budget' runs out first.
+    '''
+    table = tt.TranspositionTable.create(slots)
+    try:
+        # The first worker tries moves in order, like solve()
+        tasks = [(game_state, table.name, budget,
+            None if k == 0 else f'{seed}:{k}') for k in range(jobs)]
+        with multiprocessing.Pool(jobs) as pool:
+            for kind, solution in pool.imap_unordered(_solve_worker, tasks):
+                if kind == 'solution':
+                    return solution
+        raise TimeoutError('No solution found in time')
+    finally:
+        table.unlink()
@@ -0,0 +1,134 @@
+'''
+Pre-rendered images of the squares of the game canvas.
+
+A square is drawn as nested squares, one per color of its stack from the
+top, each inset further into its grid space. Rather than one canvas item
+per layer, every distinct stack is rendered once into a PhotoImage at the
+current grid space size, and placed on the canvas as a single image item.
+'''
+
+import collections, itertools
+
+from constants import MAX_COLORS, OUTLINE_WIDTH, SPACING, SPRITE_CACHE_SIZE
+
+# Pixels the outline of a square reaches past its edge
+OUTLINE_MARGIN = OUTLINE_WIDTH // 2
+
+def stack_signature(color_queue):
+    '''
+    Arguments:
+        color_queue: the colors of a square, from the top
+
+    Returns the tuple of the colors drawn for the square: its first
+    MAX_COLORS colors, then black if it has any more.
+    '''
+    signature = tuple(itertools.islice(color_queue, MAX_COLORS))
+    if len(color_queue) > MAX_COLORS:
+        signature += ('black',)
+    return signature
+
+def layer_boxes(space_size, depth):
+    '''
+    Arguments:
+        space_size: the size of a grid space in pixels
+        depth: the number of layers to place
+
+    Returns a list of (start, end) pixel offsets from the top left of the
+    grid space of the squares of its layers, from the top. The square of a
+    layer spans [start, end) on both axes. Layers too deep to be seen are
+    left out.
+    '''
+    spacing = space_size / SPACING
+    step = 0.25 * (space_size / 2 - spacing - 3)
+
+    boxes = []
+    for i in range(depth):
+        inset = spacing + i * step
+        start, end = round(inset), round(space_size - inset)
+        if start >= end:
+            break
+        boxes.append((start, end))
+    return boxes
+
+class SpriteCache:
+    '''
+    Maps the signatures of stacks to their images at one grid space size,
+    keeping the most recently used ones.
+    '''
+    def __init__(self, master, max_sprites=SPRITE_CACHE_SIZE):
+        '''
+        Arguments:
+            master: the widget the images are shown in
+            max_sprites: most images kept
+        '''
+        # Only the cache needs Tk, not the geometry above
+        import tkinter
+        self.photo_image = tkinter.PhotoImage
+
+        self.master = master
+        self.max_sprites = max_sprites
+        self.space_size = None
+        self.boxes = []
+        # Maps (signature, outline) to images, least recently used first
+        self.sprites = collections.OrderedDict()
+
+    def resize(self, space_size):
+        '''
+        Sets the grid space size of the images, dropping them all if it
+        changed.
+        '''
+        if space_size == self.space_size:
+            return
+        self.space_size = space_size
+        self.boxes = layer_boxes(space_size, MAX_COLORS + 1)
+        self.sprites.clear()
+
+    def get(self, signature, outline=None):
+        '''
+        Arguments:
+            signature: a stack_signature(), in which None stands for a layer
+            left transparent
+            outline: the color of the outline of the top square, or None
+
+        Returns the PhotoImage of the square, centered on its grid space.
+        The caller must keep a reference to it while it is shown, as it may
+        be dropped from the cache.
+        '''
+        key = signature, outline
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            return sprite
+
+        sprite = self.render(signature, outline)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def render(self, signature, outline=None):
+        '''
+        Returns a new PhotoImage of the square, see get().
+        '''
+        if not self.boxes:
+            return self.photo_image(master=self.master, width=1, height=1)
+
+        start, end = self.boxes[0]
+        origin = start - OUTLINE_MARGIN
+        side = end - start + 2 * OUTLINE_MARGIN
+        sprite = self.photo_image(master=self.master, width=side, height=side)
+
+        def fill(color, start, end):
+            start, end = start - origin, end - origin
+            if start < end:
+                sprite.put(color, to=(start, start, end, end))
+
+        for i, (color, (start, end)) in enumerate(zip(signature, self.boxes)):
+            if color is None:
+                continue
+            if i == 0 and outline is not None:
+                fill(outline, start - OUTLINE_MARGIN, end + OUTLINE_MARGIN)
+                start, end = start + OUTLINE_MARGIN, end - OUTLINE_MARGIN
+            fill(color, start, end)
+
+        return sprite
@@ -0,0 +1,222 @@
+'''
+Headless rendering of dissembler boards to PNG or PPM images, for previews
+of puzzle corpora.
+
+Boards are drawn as in the GUI, each square as nested squares of the colors
+of its stack, placed by sprites.layer_boxes(), without Tk. Every distinct
+stack is rendered once per cell size into rows of pixels, and the rows of
+an image are joined from them in a single pass over the board.
+
+Colors written as '#rrggbb', like the GUI's, are used as they are. Any
+other colors, such as the letters of parsed puzzles, get distinct colors in
+order of first appearance on the board.
+
+    python thumbnails.py --out previews     render the bundled puzzles
+    python thumbnails.py corpus.txt --out previews --jobs 8 --format ppm
+'''
+
+import argparse, collections, colorsys, functools, os, struct, sys, time, \
+    zlib
+
+import GameState as gs
+import puzzle_io
+import sprites
+from puzzle_io import bundled_puzzles, read_corpus
+
+FORMATS = ('png', 'ppm')
+
+DEFAULT_CELL_SIZE = 16
+
+BACKGROUND = (255, 255, 255)
+
+# Most rendered stacks kept per process
+MAX_STACKS = 4096
+
+# Number of puzzles sent to a worker process at a time
+CHUNK_SIZE = 64
+
+# Hue step between the generated colors, spreading them around the wheel
+_GOLDEN_RATIO = 0.618033988749895
+
+# Maps (stack of RGB triples, cell size) to the pixel rows of the stack. Not
+# thread-safe: threads rendering at once must hold a common lock
+_stacks = collections.OrderedDict()
+
+def palette_color(i):
+    '''
+    Returns the 'i'th of the distinct colors given to colors that are not
+    written as '#rrggbb', as '#rrggbb'.
+    '''
+    hue = i * _GOLDEN_RATIO % 1
+    return '#' + ''.join(f'{round(255 * c):02x}'
+        for c in colorsys.hsv_to_rgb(hue, 0.65, 0.9))
+
+def color_rgb(color, palette):
+    '''
+    Arguments:
+        color: a color of a GameState
+        palette: a dict mapping the colors met so far to RGB triples,
+        updated
+
+    Returns the (red, green, blue) of 'color'.
+    '''
+    rgb = palette.get(color)
+    if rgb is None:
+        if color == 'black':
+            rgb = (0, 0, 0)
+        elif isinstance(color, str) and len(color) == 7 and \
+        color[0] == '#':
+            rgb = tuple(bytes.fromhex(color[1:]))
+        else:
+            rgb = tuple(bytes.fromhex(palette_color(len(palette))[1:]))
+        palette[color] = rgb
+    return rgb
+
+def _stack_rows(stack, cell_size):
+    '''
+    Returns a list of the 'cell_size' rows of pixels, as RGB bytes, of a
+    grid space holding 'stack', a tuple of RGB triples from the top.
+    '''
+    key = stack, cell_size
+    rows = _stacks.get(key)
+    if rows is not None:
+        _stacks.move_to_end(key)
+        return rows
+
+    boxes = sprites.layer_boxes(cell_size, len(stack))
+    background = bytes(BACKGROUND) * cell_size
+    rows = []
+    for y in range(cell_size):
+        row = bytearray(background)
+        for rgb, (start, end) in zip(stack, boxes):
+            if start <= y < end:
+                row[3 * start:3 * end] = bytes(rgb) * (end - start)
+        rows.append(bytes(row))
+
+    _stacks[key] = rows
+    if len(_stacks) > MAX_STACKS:
+        _stacks.popitem(last=False)
+    return rows
+
+def render_pixels(game_state, cell_size=DEFAULT_CELL_SIZE):
+    '''
+    Returns (width, height, rows) of the image of 'game_state', where 'rows'
+    is a list of its rows of pixels as RGB bytes.
+    '''
+    if not game_state:
+        return cell_size, cell_size, [bytes(BACKGROUND) * cell_size] * \
+            cell_size
+
+    loc_to_color = game_state.loc_to_color
+    palette = {}
+    empty = _stack_rows((), cell_size)
+
+    rows = []
+    for y in range(game_state.mincol, game_state.maxcol + 1):
+        cells = []
+        for x in range(game_state.minrow, game_state.maxrow + 1):
+            color_queue = loc_to_color.get((x, y))
+            if not color_queue:
+                cells.append(empty)
+                continue
+            stack = tuple(color_rgb(color, palette)
+                for color in sprites.stack_signature(color_queue))
+            cells.append(_stack_rows(stack, cell_size))
+        rows.extend(b''.join(row) for row in zip(*cells))
+
+    return cell_size * game_state.nrows(), cell_size * game_state.ncols(), \
+        rows
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + \
+        struct.pack('>I', zlib.crc32(kind + data))
+
+def encode_png(width, height, rows):
+    '''
+    Returns the bytes of an 8-bit RGB PNG of the pixel rows.
+    '''
+    # Every row starts with filter type 0, none
+    data = zlib.compress(b''.join(b'\0' + row for row in rows))
+    return b'\x89PNG\r\n\x1a\n' + \
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0,
+            0, 0)) + \
+        _png_chunk(b'IDAT', data) + _png_chunk(b'IEND', b'')
+
+def encode_ppm(width, height, rows):
+    '''
+    Returns the bytes of a binary PPM of the pixel rows.
+    '''
+    return f'P6\n{width} {height}\n255\n'.encode() + b''.join(rows)
+
+def render(game_state, cell_size=DEFAULT_CELL_SIZE, format='png'):
+    '''
+    Arguments:
+        game_state: a GameState, not altered
+        cell_size: size of a grid space in pixels
+        format: one of FORMATS
+
+    Returns the bytes of the image of 'game_state'.
+    '''
+    if format not in FORMATS:
+        raise ValueError(f'Unknown image format {format}')
+    encode = encode_png if format == 'png' else encode_ppm
+    return encode(*render_pixels(game_state, cell_size))
+
+def render_text(text, cell_size=DEFAULT_CELL_SIZE, format='png'):
+    '''
+    Returns render() of the puzzle 'text' in the text format.
+    '''
+    return render(puzzle_io.parse(text, gs.GameState()), cell_size, format)
+
+def render_corpus(texts, cell_size=DEFAULT_CELL_SIZE, format='png', jobs=1):
+    '''
+    Arguments:
+        texts: an iterable of puzzles in the text format
+        cell_size, format: as in render()
+        jobs: number of worker processes
+
+    Yields the image of every puzzle, in order.
+    '''
+    task = functools.partial(render_text, cell_size=cell_size, format=format)
+    if jobs == 1:
+        yield from map(task, texts)
+        return
+
+    # Imported here, as rendering one board does not need it
+    import multiprocessing
+
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(task, texts, chunksize=CHUNK_SIZE)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='*',
+        help='puzzle files, one puzzle per line (default: bundled puzzles)')
+    parser.add_argument('--out', required=True,
+        help='directory to write the images to')
+    parser.add_argument('--format', choices=FORMATS, default='png',
+        help='image format (default: png)')
+    parser.add_argument('--cell-size', type=int, default=DEFAULT_CELL_SIZE,
+        help=f'pixels per grid space (default: {DEFAULT_CELL_SIZE})')
+    parser.add_argument('--jobs', type=int, default=1,
+        help='number of worker processes (default: 1)')
+    args = parser.parse_args(argv)
+
+    named = read_corpus(args.files) if args.files else bundled_puzzles()
+    os.makedirs(args.out, exist_ok=True)
+
+    start = time.perf_counter()
+    images = render_corpus([text for name, text in named], args.cell_size,
+        args.format, args.jobs)
+    for i, image in enumerate(images):
+        with open(os.path.join(args.out, f'{i:06d}.{args.format}'),
+        'wb') as file:
+            file.write(image)
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(named)} images written to {args.out} ' +
+        f'({len(named) / elapsed if elapsed else 0:.0f} per second)')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+'''
+A transposition table in shared memory, so that processes searching the
+same puzzle share what they learn about its states.
+
+The table is a fixed array of 64-bit words in a multiprocessing
+shared_memory block, created by one process and attached to by name from
+the others. There are no locks and no server process: an entry is two
+words, its data and the hash of its state XORed with the data, so an entry
+torn by two processes writing at once fails the check on lookup and reads
+as missing.
+
+Slots come in pairs. The first keeps the entry with the most layers, whose
+search saved the most work, and the second always takes the newest entry.
+'''
+
+import hashlib
+from multiprocessing import resource_tracker, shared_memory
+
+DEFAULT_SLOTS = 1 << 20
+
+# Results of a state
+UNSOLVABLE = 1
+SOLVABLE = 2
+
+_WORD = 8
+_MASK = (1 << 64) - 1
+
+def state_hash(game_state):
+    '''
+    Returns a non-zero 64-bit hash of 'game_state' that is the same in
+    every process, unlike hash().
+    '''
+    digest = hashlib.blake2b(repr(game_state.key()).encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), 'little') or 1
+
+def _pack(result, layers, length, move):
+    data = result | min(layers, 0xffff) << 2 | min(length, 0xffff) << 18
+    if move is not None:
+        (x1, y1), (x2, y2) = move
+        if x2 - x1 + y2 - y1 == 1 and 0 <= x1 < 1 << 14 and \
+        0 <= y1 < 1 << 14:
+            data |= (1 | (y2 > y1) << 1 | x1 << 2 | y1 << 16) << 34
+    return data
+
+def _unpack(data):
+    result = data & 3
+    layers = data >> 2 & 0xffff
+    length = data >> 18 & 0xffff
+    move = data >> 34
+    if move & 1:
+        x1, y1 = move >> 2 & 0x3fff, move >> 16 & 0x3fff
+        move = ((x1, y1), (x1, y1 + 1) if move & 2 else (x1 + 1, y1))
+    else:
+        move = None
+    return result, layers, length, move
+
+class TranspositionTable:
+    '''
+    Maps state hashes to what is known about the state: whether it can be
+    cleared, and if so in how many moves and with which first move.
+    '''
+    def __init__(self, shm, owner):
+        '''
+        Use create() or attach() instead.
+        '''
+        self.shm = shm
+        self.owner = owner
+        self.words = shm.buf.cast('Q')
+        self.buckets = len(self.words) // 4
+
+    @classmethod
+    def create(cls, slots=DEFAULT_SLOTS):
+        '''
+        Returns a new empty table of 'slots' entries, rounded up to an even
+        number. Its creator must unlink() it once done.
+        '''
+        slots += slots % 2
+        shm = shared_memory.SharedMemory(create=True, size=slots * 2 * _WORD)
+        return cls(shm, True)
+
+    @classmethod
+    def attach(cls, name):
+        '''
+        Returns the table called 'name' made by create() in another process.
+        '''
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # Before Python 3.13, attaching registers the memory with the
+            # resource tracker as if this process had made it, and a tracker
+            # of its own would unlink it when this process exits. It is not
+            # unregistered afterwards instead, as pool workers share the
+            # creator's tracker, which would then miss the creator's unlink
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                shm = shared_memory.SharedMemory(name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def lookup(self, key_hash):
+        '''
+        Arguments:
+            key_hash: state_hash() of a state
+
+        Returns (result, layers, length, move) of the state, or None if it
+        is not in the table. 'result' is UNSOLVABLE or SOLVABLE, 'length'
+        and 'move' describe a way to clear the board if it is SOLVABLE.
+        '''
+        words = self.words
+        start = key_hash % self.buckets * 4
+        for slot in (start, start + 2):
+            data = words[slot + 1]
+            if data and words[slot] ^ data == key_hash:
+                return _unpack(data)
+        return None
+
+    def store(self, key_hash, result, layers, length=0, move=None):
+        '''
+        Arguments:
+            key_hash: state_hash() of a state
+            result: UNSOLVABLE or SOLVABLE
+            layers: number of layers of the state
+            length: fewest moves known to clear the state, if SOLVABLE
+            move: first of those moves, if SOLVABLE
+
+        Records what is known about the state, possibly replacing another
+        state's entry.
+        '''
+        words = self.words
+        data = _pack(result, layers, length, move)
+        start = key_hash % self.buckets * 4
+
+        old = words[start + 1]
+        if not old or words[start] ^ old == key_hash or \
+        (old >> 2 & 0xffff) <= layers:
+            slot = start
+        else:
+            slot = start + 2
+
+        # Data first: a reader seeing the new data with the old check word,
+        # or the reverse, rejects the entry
+        words[slot + 1] = data
+        words[slot] = (key_hash ^ data) & _MASK
+
+    def clear(self):
+        self.shm.buf[:] = bytes(len(self.shm.buf))
+
+    def close(self):
+        self.words.release()
+        self.shm.close()
+
+    def unlink(self):
+        '''
+        Closes the table and frees its memory. Only for its creator.
+        '''
+        self.close()
+        if self.owner:
+            self.shm.unlink()